@@ -0,0 +1,61 @@
+#### Benchmark of the figure builders
+## Times every figure callback with the Plotly Express path and the graph_objects path, and compares the payload sizes.
+## Usage: NBA_DATASET_DIR=./dataset python benchmarks/figure_builders.py [repeats]
+import os
+import sys
+import time
+import importlib.util
+from plotly.io.json import to_json_plotly
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nba-scouting-stats.py')
+
+## Callback output id and representative inputs
+CALLBACK_INPUTS = [
+    ('update_graphs (team=All)', 'pts-team-season-sum', ('All',)),
+    ('update_graphs (team=Bulls)', 'pts-team-season-sum', ('Bulls',)),
+    ('update_pies', 'pts-team-player-pie', ('Bulls', '2003')),
+    ('update_graphs (player)', '..pts-player-sum.figure', ('Tyson Chandler',)),
+    ('update_players', 'shot-player', ('Tyson Chandler', '2003')),
+    ('update_player_comparison', 'pts-player-sum-comparison', (['Kobe Bryant', 'LeBron James'],)),
+]
+
+# Import the dashboard module without starting the server
+def load_app_module(path=APP_PATH):
+    spec = importlib.util.spec_from_file_location('nba_scouting_stats', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Undecorated callback function producing the given output
+def find_callback(app, output):
+    for outputs, entry in app.callback_map.items():
+        if output in outputs:
+            return entry['callback'].__wrapped__
+    raise KeyError(output)
+
+# Best wall time over the repeats and the serialized size of the outputs
+def time_callback(func, args, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = func(*args)
+        best = min(best, time.perf_counter() - start)
+    size = sum(len(to_json_plotly(output)) for output in outputs)
+    return best, size
+
+def main(repeats=5):
+    module = load_app_module()
+    ## Measure the builders, not the figure cache
+    module.FIGURE_CACHE = None
+    print(f"{'callback':<30}{'px ms':>10}{'go ms':>10}{'px KB':>10}{'go KB':>10}")
+    for label, output, args in CALLBACK_INPUTS:
+        func = find_callback(module.app, output)
+        results = {}
+        for builder in ('px', 'go'):
+            module.FIGURE_BUILDER = builder
+            results[builder] = time_callback(func, args, repeats)
+        print(f"{label:<30}{results['px'][0] * 1000:>10.1f}{results['go'][0] * 1000:>10.1f}"
+              f"{results['px'][1] / 1024:>10.1f}{results['go'][1] / 1024:>10.1f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,194 @@
+#### Benchmark suite
+## Times startup (read, cleaning, merge and the derived structures) and every callback on synthetic datasets,
+## records peak memory, and compares the median timings with the stored baselines.
+## Usage: python benchmarks/run.py [--scales 1 10 100] [--repeats 5] [--save-baseline]
+## Datasets are generated once in benchmarks/data/. Baselines depend on the machine: refresh them with --save-baseline
+## on the machine that runs the comparison. The exit code is 1 when a metric regresses.
+import os
+import sys
+import json
+import time
+import statistics
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+
+from synthetic_data import generate_dataset
+from figure_builders import load_app_module, find_callback
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARKS_DIR, 'data')
+BASELINES_PATH = os.path.join(BENCHMARKS_DIR, 'baselines.json')
+
+## A metric regresses when its median is this many times the baseline median, and the difference is above both
+## the absolute noise floor and TIME_SPREAD_FACTOR times the spread (median absolute deviation) of the repeats.
+## Timings need at least TIME_MIN_REPEATS repeats, here and in the baseline, to be compared at all
+TIME_THRESHOLD = 1.5
+TIME_NOISE_FLOOR = 0.025
+TIME_SPREAD_FACTOR = 3
+TIME_MIN_REPEATS = 3
+MEMORY_THRESHOLD = 1.2
+MEMORY_NOISE_FLOOR = 1.0
+
+# Median wall time, its spread and the number of repeats, with the peak memory (MB)
+def summarize(timings, peak_mb):
+    median = statistics.median(timings)
+    spread = statistics.median(abs(timing - median) for timing in timings)
+    return {'seconds': median, 'spread': spread, 'repeats': len(timings), 'peak_mb': peak_mb}
+
+# Wall time over the repeats, then one more run under tracemalloc for the peak memory
+def measure(func, *args, repeats=1):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, summarize(timings, peak / 2 ** 20)
+
+# Import the dashboard in a fresh process: startup time and peak RSS of the process (MB, imports included)
+def run_startup(dataset_dir, cache_dir):
+    os.environ.update({'NBA_DATASET_DIR': dataset_dir, 'NBA_CACHE_DIR': cache_dir, 'NBA_FIGURE_CACHE': 'none'})
+    start = time.perf_counter()
+    load_app_module()
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10}
+
+# Representative callback inputs: the middle season, the team and the two players with the most games
+def representative_inputs(module):
+    df = module.DATA['games']
+    seasons = sorted(df['SEASON'].unique())
+    season = str(seasons[len(seasons) // 2])
+    team = str(df['TEAM'].value_counts().index[0])
+    player1, player2 = [str(player) for player in df['PLAYER_NAME'].value_counts().index[:2]]
+    return [
+        ('update_table (sum)', 'stats-sum-table', (season, 10)),
+        ('update_table (avg)', 'stats-avg-table', (season, 10)),
+        ('update_graphs (team=All)', 'pts-team-season-sum', ('All',)),
+        ('update_graphs (team)', 'pts-team-season-sum', (team,)),
+        ('update_pies', 'pts-team-player-pie', (team, season)),
+        ('update_graphs (player)', '..pts-player-sum.figure', (player1,)),
+        ('update_players', 'shot-player', (player1, season)),
+        ('update_player_comparison', 'pts-player-sum-comparison', ([player1, player2],)),
+        ('update_trends', 'trend-table', (player1, team, list(module.DATA['trends']['days']), 10)),
+        ('update_similar_seasons', 'similar-table', (player1, season, 10)),
+    ]
+
+# Run inside a fresh process for one dataset, so that peak memory is not polluted by other scales
+def run_worker(dataset_dir, repeats):
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ.update({'NBA_DATASET_DIR': dataset_dir, 'NBA_CACHE_DIR': cache_dir, 'NBA_FIGURE_CACHE': 'none'})
+        module = load_app_module()
+
+        ## Load phases, called directly. Reading the CSVs is too slow to repeat, its time is only reported
+        sources, results['read_source_data'] = measure(module.read_source_data, dataset_dir)
+        cleaned, results['clean_data'] = measure(lambda: module.clean_data(*[df.copy() for df in sources]), repeats=repeats)
+        merged, results['merge_data'] = measure(module.merge_data, *cleaned, repeats=repeats)
+        games_full_df, results['sort_by_player_season'] = measure(module.sort_by_player_season, merged, repeats=repeats)
+        rollups, results['build_rollups'] = measure(module.build_rollups, games_full_df, repeats=repeats)
+        _, results['build_leaderboards'] = measure(module.build_leaderboards, rollups, repeats=repeats)
+        _, results['build_player_index'] = measure(module.build_player_index, games_full_df, repeats=repeats)
+        _, results['build_trend_index'] = measure(module.build_trend_index, games_full_df, rollups, repeats=repeats)
+        _, results['build_similarity_index'] = measure(module.build_similarity_index, games_full_df, repeats=repeats)
+        _, results['load_dataset (from the cache)'] = measure(module.load_dataset, dataset_dir, cache_dir, repeats=repeats)
+
+        ## Callbacks, called directly with the figure cache disabled
+        for label, output, args in representative_inputs(module):
+            _, results[label] = measure(find_callback(module.app, output), *args, repeats=repeats)
+        results['rows'] = {'count': len(module.DATA['games'])}
+    return results
+
+# Measure one scale in a subprocess, generating its dataset the first time
+def run_scale(scale, repeats):
+    dataset_dir = os.path.join(DATA_DIR, f'scale_{scale}')
+    if not os.path.exists(os.path.join(dataset_dir, 'games_details.csv')):
+        print(f'Generating the synthetic dataset at scale {scale} in {dataset_dir}')
+        generate_dataset(dataset_dir, scale)
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ## The cold startup builds the cache once, the warm one is repeated on it
+        cold = run_subprocess('--startup', dataset_dir, cache_dir)
+        results['startup (cold, builds the cache)'] = summarize([cold['seconds']], cold['peak_mb'])
+        warm = [run_subprocess('--startup', dataset_dir, cache_dir) for _ in range(repeats)]
+        results['startup (warm, from the cache)'] = summarize([run['seconds'] for run in warm], max(run['peak_mb'] for run in warm))
+    results.update(run_subprocess('--worker', dataset_dir, '--repeats', str(repeats)))
+    return results
+
+# Run this script in one of its subprocess modes and parse its JSON output
+def run_subprocess(*args):
+    output = subprocess.run([sys.executable, __file__, *args], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+# Metrics above their regression threshold
+def find_regressions(results, baseline):
+    regressions = []
+    for metric, values in results.items():
+        if metric not in baseline or 'seconds' not in values:
+            continue
+        base = baseline[metric]
+        repeated = min(values.get('repeats', 1), base.get('repeats', 1)) >= TIME_MIN_REPEATS
+        floor = max(TIME_NOISE_FLOOR, TIME_SPREAD_FACTOR * max(values.get('spread', 0), base.get('spread', 0)))
+        if repeated and values['seconds'] > base['seconds'] * TIME_THRESHOLD and values['seconds'] - base['seconds'] > floor:
+            regressions.append(f"{metric}: {values['seconds'] * 1000:.1f} ms vs baseline {base['seconds'] * 1000:.1f} ms")
+        if values['peak_mb'] > base['peak_mb'] * MEMORY_THRESHOLD and values['peak_mb'] - base['peak_mb'] > MEMORY_NOISE_FLOOR:
+            regressions.append(f"{metric}: {values['peak_mb']:.1f} MB vs baseline {base['peak_mb']:.1f} MB")
+    return regressions
+
+def print_results(scale, results, baseline):
+    print(f"\nScale {scale} ({results['rows']['count']} rows in games_full_df)")
+    print(f"{'metric':<40}{'ms':>10}{'spread':>10}{'baseline':>10}{'peak MB':>10}{'baseline':>10}")
+    for metric, values in results.items():
+        if 'seconds' not in values:
+            continue
+        base = baseline.get(metric, {})
+        base_ms = f"{base['seconds'] * 1000:.1f}" if base else '-'
+        base_mb = f"{base['peak_mb']:.1f}" if base else '-'
+        spread = f"{values['spread'] * 1000:.1f}" if values['repeats'] >= TIME_MIN_REPEATS else '-'
+        print(f"{metric:<40}{values['seconds'] * 1000:>10.1f}{spread:>10}{base_ms:>10}{values['peak_mb']:>10.1f}{base_mb:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark startup and callbacks on synthetic datasets')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--repeats', type=int, default=5, help=f'timed runs per metric, at least {TIME_MIN_REPEATS}')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--startup', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.repeats = max(args.repeats, TIME_MIN_REPEATS)
+
+    if args.startup:
+        print(json.dumps(run_startup(*args.startup)))
+        return 0
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.repeats)))
+        return 0
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+    regressions = []
+    for scale in args.scales:
+        results = run_scale(scale, args.repeats)
+        baseline = baselines.get(str(scale), {})
+        print_results(scale, results, baseline)
+        regressions += [f'scale {scale} - {regression}' for regression in find_regressions(results, baseline)]
+        if args.save_baseline:
+            baselines[str(scale)] = results
+    if args.save_baseline:
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        return 0
+    if regressions:
+        print('\nRegressions:\n' + '\n'.join(regressions))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#### Synthetic dataset generator
+## Writes games.csv, games_details.csv, teams.csv and players.csv with the same columns as the Kaggle NBA dataset.
+## Scale 1 is about the size of the real dataset (19 seasons, 1230 games per season), scale N has N times the games per season.
+## Usage: python benchmarks/synthetic_data.py <output dir> [scale]
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+SEASONS = list(range(2003, 2022))
+GAMES_PER_SEASON = 1230
+ROSTER_SIZE = 15
+## Players per team in each game box score, the last ones did not play (empty MIN and stats)
+PLAYERS_PER_GAME = 13
+DNP_PER_GAME = 2
+TEAM_NICKNAMES = ['Hawks', 'Celtics', 'Cavaliers', 'Pelicans', 'Bulls', 'Mavericks', 'Nuggets', 'Warriors', 'Rockets', 'Clippers',
+                  'Lakers', 'Heat', 'Bucks', 'Timberwolves', 'Nets', 'Knicks', 'Magic', 'Pacers', '76ers', 'Suns',
+                  'Trail Blazers', 'Kings', 'Spurs', 'Thunder', 'Raptors', 'Jazz', 'Grizzlies', 'Wizards', 'Pistons', 'Hornets']
+TEAM_IDS = np.arange(1610612737, 1610612737 + len(TEAM_NICKNAMES))
+STATS_RANGES = {'FGA': 25, 'FTA': 12, 'OREB': 6, 'DREB': 12, 'AST': 12, 'STL': 4, 'BLK': 4, 'TO': 6, 'PF': 6}
+
+GAMES_COLUMNS = ['GAME_DATE_EST', 'GAME_ID', 'GAME_STATUS_TEXT', 'HOME_TEAM_ID', 'VISITOR_TEAM_ID', 'SEASON', 'TEAM_ID_home', 'PTS_home',
+                 'FG_PCT_home', 'FT_PCT_home', 'FG3_PCT_home', 'AST_home', 'REB_home', 'TEAM_ID_away', 'PTS_away', 'FG_PCT_away',
+                 'FT_PCT_away', 'FG3_PCT_away', 'AST_away', 'REB_away', 'HOME_TEAM_WINS']
+GAMES_DETAILS_COLUMNS = ['GAME_ID', 'TEAM_ID', 'TEAM_ABBREVIATION', 'TEAM_CITY', 'PLAYER_ID', 'PLAYER_NAME', 'NICKNAME', 'START_POSITION',
+                         'COMMENT', 'MIN', 'FGM', 'FGA', 'FG_PCT', 'FG3M', 'FG3A', 'FG3_PCT', 'FTM', 'FTA', 'FT_PCT', 'OREB', 'DREB',
+                         'REB', 'AST', 'STL', 'BLK', 'TO', 'PF', 'PTS', 'PLUS_MINUS']
+
+def player_names(player_ids):
+    return np.char.add('Player ', np.char.zfill(player_ids.astype(str), 6))
+
+def teams_frame():
+    return pd.DataFrame({
+        'LEAGUE_ID': '00', 'TEAM_ID': TEAM_IDS, 'MIN_YEAR': 1946, 'MAX_YEAR': 2019,
+        'ABBREVIATION': [nickname[:3].upper() for nickname in TEAM_NICKNAMES], 'NICKNAME': TEAM_NICKNAMES, 'YEARFOUNDED': 1946,
+        'CITY': 'City', 'ARENA': 'Arena', 'ARENACAPACITY': 18000.0, 'OWNER': 'Owner', 'GENERALMANAGER': 'Manager',
+        'HEADCOACH': 'Coach', 'DLEAGUEAFFILIATION': 'Affiliate',
+    })
+
+# Rosters of one season: (team, slot) --> player id, players move between teams across seasons
+def season_rosters(rng, player_pool):
+    return rng.permutation(player_pool)[:len(TEAM_IDS) * ROSTER_SIZE].reshape(len(TEAM_IDS), ROSTER_SIZE)
+
+def season_frames(rng, season, scale, rosters, names):
+    n_games = GAMES_PER_SEASON * scale
+    home = rng.integers(0, len(TEAM_IDS), n_games)
+    away = (home + rng.integers(1, len(TEAM_IDS), n_games)) % len(TEAM_IDS)
+    game_ids = season * 1000000 % 100000000 + np.arange(n_games) + 20000000
+    dates = pd.Timestamp(f'{season}-10-20') + pd.to_timedelta(rng.integers(0, 180, n_games), unit='D')
+
+    ## Box scores: PLAYERS_PER_GAME rows per team and game
+    n_rows = n_games * 2 * PLAYERS_PER_GAME
+    game_idx = np.repeat(np.arange(n_games), 2 * PLAYERS_PER_GAME)
+    is_away = np.tile(np.repeat([0, 1], PLAYERS_PER_GAME), n_games)
+    slot = np.tile(np.arange(PLAYERS_PER_GAME), n_games * 2)
+    team_idx = np.where(is_away == 1, away[game_idx], home[game_idx])
+    ## The roster slots used by a game rotate, so that every player of the roster gets games
+    roster_slot = (slot + game_idx) % ROSTER_SIZE
+    player_ids = rosters[team_idx, roster_slot]
+    played = slot < PLAYERS_PER_GAME - DNP_PER_GAME
+
+    stats = {col: rng.integers(0, high + 1, n_rows).astype(float) for col, high in STATS_RANGES.items()}
+    stats['FGM'] = np.floor(stats['FGA'] * rng.random(n_rows))
+    stats['FG3A'] = np.floor(stats['FGA'] * rng.random(n_rows) * 0.5)
+    stats['FG3M'] = np.floor(stats['FG3A'] * rng.random(n_rows))
+    stats['FTM'] = np.floor(stats['FTA'] * rng.random(n_rows))
+    stats['REB'] = stats['OREB'] + stats['DREB']
+    stats['PTS'] = 2 * stats['FGM'] + stats['FG3M'] + stats['FTM']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for pct, made, attempted in (('FG_PCT', 'FGM', 'FGA'), ('FG3_PCT', 'FG3M', 'FG3A'), ('FT_PCT', 'FTM', 'FTA')):
+            stats[pct] = np.nan_to_num(stats[made] / stats[attempted]).round(3)
+    stats['PLUS_MINUS'] = rng.integers(-25, 26, n_rows).astype(float)
+    for col in stats:
+        stats[col][~played] = np.nan
+    minutes = rng.integers(1, 45, n_rows)
+    seconds = rng.integers(0, 60, n_rows)
+
+    details = pd.DataFrame({
+        'GAME_ID': game_ids[game_idx], 'TEAM_ID': TEAM_IDS[team_idx], 'TEAM_ABBREVIATION': 'ABC', 'TEAM_CITY': 'City',
+        'PLAYER_ID': player_ids, 'PLAYER_NAME': names[player_ids],
+        'NICKNAME': np.where(slot % 3 == 0, 'Nick', None), 'START_POSITION': np.where(slot < 5, 'F', None),
+        'COMMENT': np.where(played, None, 'DNP - Coach\'s Decision'),
+        'MIN': np.where(played, np.char.add(np.char.add(minutes.astype(str), ':'), np.char.zfill(seconds.astype(str), 2)), None),
+        **stats,
+    })[GAMES_DETAILS_COLUMNS]
+
+    ## Team totals of the box scores
+    team_totals = details.groupby([game_idx, is_away])[['PTS', 'AST', 'REB', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA']].sum()
+    home_totals = team_totals.xs(0, level=1)
+    away_totals = team_totals.xs(1, level=1)
+    games = pd.DataFrame({
+        'GAME_DATE_EST': dates.strftime('%Y-%m-%d'), 'GAME_ID': game_ids, 'GAME_STATUS_TEXT': 'Final',
+        'HOME_TEAM_ID': TEAM_IDS[home], 'VISITOR_TEAM_ID': TEAM_IDS[away], 'SEASON': season, 'TEAM_ID_home': TEAM_IDS[home],
+        'TEAM_ID_away': TEAM_IDS[away],
+    })
+    for side, totals in (('home', home_totals), ('away', away_totals)):
+        games[f'PTS_{side}'] = totals['PTS'].to_numpy()
+        games[f'FG_PCT_{side}'] = (totals['FGM'] / totals['FGA']).round(3).to_numpy()
+        games[f'FT_PCT_{side}'] = (totals['FTM'] / totals['FTA']).round(3).to_numpy()
+        games[f'FG3_PCT_{side}'] = (totals['FG3M'] / totals['FG3A']).round(3).to_numpy()
+        games[f'AST_{side}'] = totals['AST'].to_numpy()
+        games[f'REB_{side}'] = totals['REB'].to_numpy()
+    games['HOME_TEAM_WINS'] = (games['PTS_home'] > games['PTS_away']).astype(int)
+    return games[GAMES_COLUMNS], details
+
+# Write the four CSVs for the given scale, one season at a time to keep memory bounded
+def generate_dataset(output_dir, scale=1, seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    teams_frame().to_csv(os.path.join(output_dir, 'teams.csv'), index=False)
+    player_pool = np.arange(len(TEAM_IDS) * ROSTER_SIZE * 3)
+    names = player_names(player_pool).astype(object)
+    paths = {name: os.path.join(output_dir, f'{name}.csv') for name in ('games', 'games_details', 'players')}
+    for i, season in enumerate(SEASONS):
+        rosters = season_rosters(rng, player_pool)
+        games, details = season_frames(rng, season, scale, rosters, names)
+        players = pd.DataFrame({'PLAYER_NAME': names[rosters.ravel()],
+                                'TEAM_ID': np.repeat(TEAM_IDS, ROSTER_SIZE), 'PLAYER_ID': rosters.ravel(), 'SEASON': season})
+        for name, frame in (('games', games), ('games_details', details), ('players', players)):
+            frame.to_csv(paths[name], mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+if __name__ == '__main__':
+    generate_dataset(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1)
@@ -0,0 +1,26 @@
+#### Gunicorn configuration for the production server
+## Usage: gunicorn -c gunicorn.conf.py wsgi:server
+import os
+import sys
+import shutil
+import multiprocessing
+
+bind = os.environ.get('NBA_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('NBA_WORKERS', multiprocessing.cpu_count()))
+## Load the app, and the dataset, once in the master before forking the workers
+preload_app = True
+timeout = 60
+
+## Workers share the memory-mapped dataset and the on-disk figure cache
+os.environ.setdefault('NBA_MMAP', '1')
+os.environ.setdefault('NBA_FIGURE_CACHE', 'disk')
+## /metrics and /figure-cache sum the counters every process writes here. Emptied when the server starts,
+## this file is read before the app is loaded in the master
+os.environ.setdefault('NBA_METRICS_DIR', os.path.join(os.environ.get('NBA_DATASET_DIR', './dataset'), 'metrics'))
+shutil.rmtree(os.environ['NBA_METRICS_DIR'], ignore_errors=True)
+
+## Every worker watches the source CSVs for appended rows when NBA_REFRESH_INTERVAL is set: one at a time
+## refreshes behind the cache lock file, the others map the cache version it publishes.
+## The thread is started after the fork, threads of the master process do not survive it
+def post_fork(server, worker):
+    sys.modules['wsgi'].dashboard.start_refresh_watcher()
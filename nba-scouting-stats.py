@@ -1,9 +1,40 @@
 #### Library import
+import os
+import sys
+import json
+import shutil
+import hashlib
+import io
+import gzip
+import pickle
+import functools
+import threading
+import time
+import logging
+from bisect import bisect_left
+from datetime import datetime, timezone
+from collections import OrderedDict
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
 import streamlit as st
-from dash import Dash, dcc, html, Input, Output, callback, dash_table
+from dash import Dash, dcc, html, Input, Output, State, callback, dash_table
+from flask import Response, request
+from dash.exceptions import PreventUpdate
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+## Arrow responses of the stats API are optional, JSON works without pyarrow
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+## Only one process refreshes the dataset at a time, behind a lock file; without fcntl every process refreshes
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 #### Default variables
 EXTERNAL_STYLESHEET = [{
@@ -14,41 +45,1381 @@ EXTERNAL_STYLESHEET = [{
 
 GENERAL_STATS_COLUMNS = [
     { 'name': 'STATS TYPE', 'id': '0'},
+    { 'name': 'RANK', 'id': '4'},
     { 'name': 'PLAYER', 'id': '1'},
     { 'name': 'TEAM', 'id': '2'},
     { 'name': 'STATS VALUE', 'id': '3'},
 ]
 
+STATS_COLUMNS = ['PTS','REB', 'AST', 'FG3M', 'FG3A']
+## Made and attempted field goals and free throws, only used for the shooting percentages
+SHOOTING_COLUMNS = ['FGM', 'FGA', 'FTM', 'FTA']
+
+DATASET_DIR = os.environ.get('NBA_DATASET_DIR', './dataset')
+CACHE_DIR = os.environ.get('NBA_CACHE_DIR', os.path.join(DATASET_DIR, 'cache'))
+## Bump when the cleaning/merge logic or the cache layout changes, it invalidates every existing cache
+CACHE_VERSION = 8
+## Source files that end up in games_full_df, their size and mtime make the cache fingerprint
+SOURCE_FILES = ['teams.csv', 'games.csv', 'games_details.csv']
+## Source files that a refresh may ingest incrementally, when rows are only appended to them
+APPENDABLE_FILES = ['games.csv', 'games_details.csv']
+## Bytes before the ingested offset that must not change for new bytes to count as appended rows
+CHECKPOINT_BYTES = 4096
+## Refreshes a box score line waits for its game to reach games.csv, afterwards it is dropped like a full reload does
+PENDING_REFRESHES = 3
+## Memory-map the cached columns read-only: the worker processes of a server share them through the page cache
+CACHE_MMAP = os.environ.get('NBA_MMAP', '0') == '1'
+DROPDOWN_COLUMNS = ['SEASON', 'TEAM']
+## Seconds between two checks for new rows in the source CSVs, 0 disables the watcher
+REFRESH_INTERVAL = float(os.environ.get('NBA_REFRESH_INTERVAL', '0'))
+## Token expected in the X-Refresh-Token header of POST /admin/refresh, the route is disabled without it
+REFRESH_TOKEN = os.environ.get('NBA_REFRESH_TOKEN')
+## Rows per chunk when streaming games_details.csv, 0 reads the whole file at once
+CSV_CHUNKSIZE = int(os.environ.get('NBA_CSV_CHUNKSIZE', '0'))
+
+## Columns read from games_details.csv and their dtype on read.
+## Stats are read as float32 because DNP rows leave them empty, they are downcast to integers after cleaning
+GAMES_DETAILS_SCHEMA = {
+    'GAME_ID': 'int32',
+    'TEAM_ID': 'int32',
+    'PLAYER_NAME': 'category',
+    'MIN': 'str',
+    'PLUS_MINUS': 'float32',
+    'PTS': 'float32',
+    'REB': 'float32',
+    'AST': 'float32',
+    'FG3M': 'float32',
+    'FG3A': 'float32',
+    'FGM': 'float32',
+    'FGA': 'float32',
+    'FTM': 'float32',
+    'FTA': 'float32',
+}
+## games.csv is small and read whole, every column counts for the NaN cleaning; only these are kept
+GAMES_SCHEMA = {'GAME_ID': 'int32', 'SEASON': 'int16', 'GAME_DATE_EST': 'datetime64[ns]'}
+## Physical order of games_full_df: every (player, season) is a contiguous block of games in date order
+PLAYER_INDEX_ORDER = ['PLAYER_NAME', 'SEASON', 'GAME_DATE_EST', 'GAME_ID']
+TEAMS_SCHEMA = {'TEAM_ID': 'int32', 'NICKNAME': 'category'}
+
+## Figure cache for the callbacks: 'memory' (per process), 'disk' (shared by the workers of a box) or 'none'
+FIGURE_CACHE_BACKEND = os.environ.get('NBA_FIGURE_CACHE', 'memory')
+FIGURE_CACHE_SIZE = int(os.environ.get('NBA_FIGURE_CACHE_SIZE', '512'))
+FIGURE_CACHE_DIR = os.environ.get('NBA_FIGURE_CACHE_DIR', os.path.join(DATASET_DIR, 'figure_cache'))
+
+## Season leaderboards: players ranked per stat, ties share a rank and are all kept
+LEADERBOARD_SIZE = 10
+LEADERBOARD_SIZE_OPTIONS = [1, 3, 5, 10]
+## Minimum games played to enter the average leaderboards
+LEADERBOARD_MIN_GAMES = int(os.environ.get('NBA_LEADERBOARD_MIN_GAMES', '0'))
+
+## Player dropdowns load their options from the server while typing, at most this many matches per search
+PLAYER_SEARCH_LIMIT = 20
+PLAYER_DROPDOWNS = ['player-dropdown', 'player-dropdown-match', 'players-dropdown-comparison', 'player-dropdown-trend', 'player-dropdown-similar']
+## Players shown at most by the comparison charts
+PLAYER_COMPARISON_LIMIT = 10
+
+## Similar player seasons: per game stats, minutes and shooting percentages compared after a z-score per feature
+SIMILARITY_FEATURES = ['PTS', 'REB', 'AST', 'FG3M', 'FG3A', 'MIN', 'FG_PCT', 'FG3_PCT', 'FT_PCT']
+## Seasons with fewer games are not proposed as comparables, their averages are mostly noise
+SIMILARITY_MIN_GAMES = int(os.environ.get('NBA_SIMILARITY_MIN_GAMES', '10'))
+## Parts of the similarity index stored in the dataset cache
+SIMILARITY_PARTS = ['seasons', 'matrix', 'norms', 'eligible', 'players']
+SIMILAR_SIZE = 10
+SIMILAR_SIZE_OPTIONS = [5, 10, 20, 50]
+SIMILAR_COLUMNS = [{'name': 'RANK', 'id': 'RANK'}, {'name': 'PLAYER', 'id': 'PLAYER_NAME'}, {'name': 'SEASON', 'id': 'SEASON'},
+                   {'name': 'GAMES', 'id': 'GAMES'}] + [{'name': col, 'id': col} for col in SIMILARITY_FEATURES] + [{'name': 'DISTANCE', 'id': 'DISTANCE'}]
+
+## Trends over a time period: rolling window sizes (last N games) and the default one
+TREND_WINDOW_OPTIONS = [1, 5, 10, 20, 40]
+TREND_WINDOW = 10
+TREND_COLUMNS = [
+    { 'name': 'STATS TYPE', 'id': 'STAT'},
+    { 'name': 'PLAYER TOTAL', 'id': 'PLAYER_SUM'},
+    { 'name': 'PLAYER AVERAGE', 'id': 'PLAYER_MEAN'},
+    { 'name': 'TEAM TOTAL', 'id': 'TEAM_SUM'},
+    { 'name': 'TEAM AVERAGE', 'id': 'TEAM_MEAN'},
+]
+NANOSECONDS_PER_DAY = 86400 * 10**9
+
+## Figures are built from graph_objects traces ('go') or through Plotly Express ('px', the old path kept for benchmarks)
+FIGURE_BUILDER = os.environ.get('NBA_FIGURE_BUILDER', 'go')
+## Line figures with more points than this switch to WebGL traces
+SCATTERGL_THRESHOLD = 2000
+## Decimals kept for the float values sent to the browser
+FIGURE_DECIMALS = 2
+## Layout keys of the default template used by line and pie charts, the rest is dropped from every payload
+FIGURE_TEMPLATE_KEYS = ['autotypenumbers', 'colorway', 'font', 'hovermode', 'hoverlabel', 'paper_bgcolor', 'plot_bgcolor', 'xaxis', 'yaxis', 'title']
+FIGURE_TEMPLATE = go.layout.Template(layout={key: pio.templates['plotly'].layout[key] for key in FIGURE_TEMPLATE_KEYS})
+
+## Opt-in instrumentation of the callbacks and of the data load, exported on /metrics
+METRICS_ENABLED = os.environ.get('NBA_METRICS', '0') == '1'
+## Directory shared by the worker processes of a server: each one writes its histograms and figure cache counters
+## there, /metrics and /figure-cache report the sum over the processes. Without it they are per process numbers
+METRICS_DIR = os.environ.get('NBA_METRICS_DIR')
+## Callbacks slower than this are logged with their inputs and timings
+SLOW_CALLBACK_SECONDS = float(os.environ.get('NBA_SLOW_CALLBACK_MS', '500')) / 1000
+## Phases of a callback, the other timed steps belong to the data load
+CALLBACK_PHASES = ('data', 'figure')
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+PAYLOAD_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+METRICS_HELP = {
+    'nba_callback_duration_seconds': 'Wall time of the Dash callbacks',
+    'nba_callback_cpu_seconds': 'CPU time of the Dash callbacks',
+    'nba_callback_phase_seconds': 'Wall time of the callbacks split between data lookups and figure building',
+    'nba_callback_payload_bytes': 'Serialized size of the callback outputs',
+    'nba_load_phase_seconds': 'Wall time of the data load phases',
+}
+
+## Stats API: rows per page by default and at most, decimals of the JSON floats, smallest body worth compressing
+API_PAGE_SIZE = 500
+API_MAX_PAGE_SIZE = 10000
+API_DECIMALS = 3
+API_GZIP_MIN_BYTES = 1024
+API_MIMETYPES = {'json': 'application/json', 'arrow': 'application/vnd.apache.arrow.stream'}
+
+## Aggregation levels precomputed once at load time, shared by every callback
+ROLLUP_LEVELS = {
+    'season_team_player': ['SEASON', 'TEAM', 'PLAYER_NAME'],
+    'season_player': ['SEASON', 'PLAYER_NAME'],
+    'season_team_game': ['SEASON', 'TEAM', 'GAME_ID'],
+    'season_team': ['SEASON', 'TEAM'],
+}
+
 #### General functions
 
-#### MAIN
+logger = logging.getLogger('nba_scouting_stats')
 
-# Read data
-teams_df = pd.read_csv('./dataset/teams.csv')
-games_df = pd.read_csv('./dataset/games.csv')
-games_details_df = pd.read_csv('./dataset/games_details.csv')
-players_df = pd.read_csv('./dataset/players.csv')
-ranking_df = pd.read_csv('./dataset/ranking.csv')
+## Histograms of the instrumentation: name --> {labels: {'buckets': [...], 'sum': x, 'count': n}}
+METRICS = {}
+METRICS_LOCK = threading.Lock()
+## Phase timings of the callback running in the current thread
+METRICS_LOCAL = threading.local()
+## Snapshot file of the current process in METRICS_DIR, and what it last recorded
+METRICS_FILE = None
+METRICS_WRITTEN = None
+
+# Add one observation to a histogram
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    labels = tuple(sorted(labels.items()))
+    with METRICS_LOCK:
+        histogram = METRICS.setdefault(name, {}).setdefault(labels, {'le': buckets, 'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0})
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+# Histograms and figure cache counters of the current process, as JSON-ready data
+def metrics_snapshot():
+    with METRICS_LOCK:
+        histograms = [[name, labels, {**histogram, 'buckets': list(histogram['buckets'])}]
+                      for name, series in METRICS.items() for labels, histogram in series.items()]
+    counters = {'hits': FIGURE_CACHE.hits, 'misses': FIGURE_CACHE.misses} if FIGURE_CACHE is not None else {'hits': 0, 'misses': 0}
+    return {'histograms': histograms, 'figure_cache': counters}
+
+# Write the snapshot of the current process to METRICS_DIR when it changed. The file is named after the pid and
+# the start time, so a reused pid does not overwrite the counters of an exited worker, which still count
+def write_metrics_snapshot():
+    global METRICS_FILE, METRICS_WRITTEN
+    snapshot = metrics_snapshot()
+    if snapshot == METRICS_WRITTEN:
+        return
+    if METRICS_FILE is None:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        METRICS_FILE = os.path.join(METRICS_DIR, f'{os.getpid()}-{time.time_ns()}.json')
+    tmp_path = f'{METRICS_FILE}.tmp-{threading.get_ident()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, METRICS_FILE)
+    METRICS_WRITTEN = snapshot
+
+# Snapshots of every process: the current one and, with METRICS_DIR, the last ones written by the others
+def read_metrics_snapshots():
+    if not METRICS_DIR:
+        return [metrics_snapshot()]
+    write_metrics_snapshot()
+    snapshots = []
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+# A forked worker starts from empty counters: what the master recorded before the fork is in the master snapshot
+def reset_forked_metrics():
+    global METRICS_FILE, METRICS_WRITTEN
+    METRICS.clear()
+    METRICS_FILE = METRICS_WRITTEN = None
+    if FIGURE_CACHE is not None:
+        FIGURE_CACHE.hits = FIGURE_CACHE.misses = 0
+
+# Histograms summed over the snapshots, in the Prometheus text exposition format
+def render_metrics(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, labels, histogram in snapshot['histograms']:
+            total = merged.setdefault(name, {}).setdefault(tuple(map(tuple, labels)), {'le': histogram['le'], 'buckets': [0] * len(histogram['le']), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+    lines = []
+    for name, series in merged.items():
+        lines += [f'# HELP {name} {METRICS_HELP[name]}', f'# TYPE {name} histogram']
+        for labels, histogram in series.items():
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            for bound, count in zip(histogram['le'], histogram['buckets']):
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{name}_sum{{{label_text}}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{{label_text}}} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+# Figure cache hits and misses summed over the snapshots
+def figure_cache_counters(snapshots):
+    return {counter: sum(snapshot['figure_cache'][counter] for snapshot in snapshots) for counter in ('hits', 'misses')}
+
+# Time a step: inside a callback it adds to the callback phase ('data' or 'figure'), outside it is a data load phase.
+# The callback phases are not recorded outside a callback, e.g. from the stats API. A no-op unless NBA_METRICS=1
+def timed(phase):
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                phases = getattr(METRICS_LOCAL, 'phases', None)
+                if phases is not None:
+                    phases[phase] = phases.get(phase, 0.0) + elapsed
+                elif phase not in CALLBACK_PHASES:
+                    observe('nba_load_phase_seconds', {'phase': phase}, elapsed)
+        return wrapper
+    return decorator
+
+# Record wall time, CPU time, phases and payload size of a callback, and log it when it is slow
+def instrument_callback(name, func):
+    @functools.wraps(func)
+    def wrapper(*args):
+        METRICS_LOCAL.phases = {}
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            outputs = func(*args)
+        finally:
+            wall, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+            phases, METRICS_LOCAL.phases = METRICS_LOCAL.phases, None
+        payload = len(to_json_plotly(outputs))
+        observe('nba_callback_duration_seconds', {'callback': name}, wall)
+        observe('nba_callback_cpu_seconds', {'callback': name}, cpu)
+        observe('nba_callback_payload_bytes', {'callback': name}, payload, PAYLOAD_BUCKETS)
+        for phase, elapsed in phases.items():
+            observe('nba_callback_phase_seconds', {'callback': name, 'phase': phase}, elapsed)
+        if wall >= SLOW_CALLBACK_SECONDS:
+            logger.warning(json.dumps({'event': 'slow_callback', 'callback': name, 'wall_ms': round(wall * 1000, 1), 'cpu_ms': round(cpu * 1000, 1),
+                                       'phases_ms': {phase: round(elapsed * 1000, 1) for phase, elapsed in phases.items()},
+                                       'payload_bytes': payload, 'inputs': list(args)}, default=str))
+        return outputs
+    return wrapper
+
+# Wrap app.callback so that every callback registered through it is instrumented, named after
+# its function and first output
+def instrument_app_callbacks(register):
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+        first_output = next(arg for arg in args if isinstance(arg, Output))
+        def wrap(func):
+            return decorator(instrument_callback(f'{func.__name__}:{first_output.component_id}', func))
+        return wrap
+    return callback
+
+# Build sums, counts and means of STATS_COLUMNS for every level of ROLLUP_LEVELS
+@timed('build_rollups')
+def build_rollups(df):
+    rollups = {}
+    for level, keys in ROLLUP_LEVELS.items():
+        if level == 'season_team':
+            continue
+        grouped = df.groupby(keys, sort=True, observed=True)[STATS_COLUMNS]
+        rollups[level] = {'sum': grouped.sum(), 'count': grouped.count(), 'mean': grouped.mean()}
+    rollups['season_team'] = build_team_rollup(rollups['season_team_game']['sum'])
+    return rollups
+
+# Team averages are per game: average the game totals, not the single player rows
+def build_team_rollup(game_sum):
+    grouped = game_sum.groupby(ROLLUP_LEVELS['season_team'], sort=True, observed=True)
+    return {'sum': grouped.sum(), 'count': grouped.count(), 'mean': grouped.mean()}
+
+# Add the rollups of newly ingested rows to the existing ones. Only the small aggregated tables are
+# regrouped, the team level is derived again from the merged game totals
+@timed('merge_rollups')
+def merge_rollups(rollups, delta_rollups):
+    merged = {}
+    for level, keys in ROLLUP_LEVELS.items():
+        if level == 'season_team':
+            continue
+        sums = pd.concat([rollups[level]['sum'], delta_rollups[level]['sum']]).groupby(level=keys, sort=True).sum()
+        counts = pd.concat([rollups[level]['count'], delta_rollups[level]['count']]).groupby(level=keys, sort=True).sum()
+        merged[level] = {'sum': sums, 'count': counts, 'mean': sums / counts}
+    merged['season_team'] = build_team_rollup(merged['season_team_game']['sum'])
+    return merged
+
+# Return a flat slice of a rollup, filtered on one or more of its index levels
+@timed('data')
+def lookup_rollup(rollups, level, agg, **keys):
+    table = rollups[level][agg]
+    if keys:
+        try:
+            table = table.xs(tuple(keys.values()), level=list(keys), drop_level=False)
+        except KeyError:
+            table = table.iloc[0:0]
+    return table.reset_index()
+
+# Rank the players of every season for each stat, keeping the top_k ranks (ties included).
+# Returns {'sum': {season: leaderboard}, 'mean': {season: leaderboard}}
+@timed('build_leaderboards')
+def build_leaderboards(rollups, top_k=LEADERBOARD_SIZE, min_games=LEADERBOARD_MIN_GAMES):
+    leaderboards = {}
+    for agg in ('sum', 'mean'):
+        table = rollups['season_team_player'][agg]
+        if agg == 'mean':
+            table = table[rollups['season_team_player']['count']['PTS'] >= min_games].round(decimals=2)
+        long_df = table.reset_index().melt(id_vars=ROLLUP_LEVELS['season_team_player'], value_vars=STATS_COLUMNS, var_name='STAT', value_name='VALUE')
+        long_df['STAT'] = pd.Categorical(long_df['STAT'], categories=STATS_COLUMNS, ordered=True)
+        long_df['RANK'] = long_df.groupby(['SEASON', 'STAT'], observed=True)['VALUE'].rank(method='min', ascending=False).astype('int32')
+        long_df = long_df[long_df['RANK'] <= top_k].sort_values(['SEASON', 'STAT', 'RANK', 'PLAYER_NAME'])
+        leaderboards[agg] = {season: board.reset_index(drop=True) for season, board in long_df.groupby('SEASON')}
+    return leaderboards
+
+# Top k rows of a season leaderboard, formatted for the season stats tables
+@timed('data')
+def leaderboard_table(leaderboards, agg, season, top_k):
+    board = leaderboards[agg].get(int(season))
+    if board is None:
+        return []
+    board = board[board['RANK'] <= int(top_k)]
+    return board[['STAT', 'PLAYER_NAME', 'TEAM', 'VALUE', 'RANK']].astype({'STAT': str, 'PLAYER_NAME': str, 'TEAM': str}).set_axis(['0', '1', '2', '3', '4'], axis=1).to_dict('records')
+
+# Values of a column ready for a trace: floats rounded to FIGURE_DECIMALS, categoricals as plain strings
+def trace_values(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(str).to_numpy()
+    values = values.to_numpy()
+    if values.dtype.kind == 'f':
+        return values.round(FIGURE_DECIMALS)
+    return values
+
+# Line chart with markers, one trace per value of color or per column of y
+@timed('figure')
+def line_figure(df, x, y, title, colors, color=None):
+    if FIGURE_BUILDER == 'px':
+        return px.line(df, x=x, y=y, markers=True, color=color, color_discrete_sequence=colors, title=title)
+    y_columns = y if isinstance(y, list) else [y]
+    if color is not None:
+        series = [(str(name), group[x], group[y]) for name, group in df.groupby(color, sort=False, observed=True)]
+        legend_title = color
+    else:
+        series = [(col, df[x], df[col]) for col in y_columns]
+        legend_title = 'variable'
+    ## A single series has nothing to tell apart, like in Plotly Express
+    show_legend = color is not None or len(y_columns) > 1
+    ## Traces are passed as plain dicts, go.Figure validates them once instead of once per trace object
+    trace_type = 'scattergl' if len(df) * len(y_columns) > SCATTERGL_THRESHOLD else 'scatter'
+    traces = [{'type': trace_type, 'x': trace_values(x_values), 'y': trace_values(y_values), 'name': name, 'mode': 'lines+markers',
+               'line': {'color': colors[i % len(colors)]}, 'showlegend': show_legend}
+              for i, (name, x_values, y_values) in enumerate(series)]
+    return go.Figure(data=traces, layout={
+        'template': FIGURE_TEMPLATE,
+        'title': {'text': title},
+        'xaxis': {'title': {'text': x}},
+        'yaxis': {'title': {'text': y if color is not None or len(y_columns) == 1 else 'value'}},
+        'legend': {'title': {'text': legend_title}},
+    })
+
+# Donut chart of values split by names
+@timed('figure')
+def pie_figure(df, values, names, title, colors, hole):
+    if FIGURE_BUILDER == 'px':
+        return px.pie(df, values=df[values], names=df[names], color_discrete_sequence=colors, title=title, hole=hole)
+    return go.Figure(data=[{'type': 'pie', 'labels': trace_values(df[names]), 'values': trace_values(df[values]), 'hole': hole}], layout={
+        'template': FIGURE_TEMPLATE,
+        'title': {'text': title},
+        'piecolorway': colors,
+    })
+
+# Parse the MIN column ("36:12", "36" or NaN) into float32 minutes
+def parse_minutes(values):
+    parts = values.astype(str).str.split(':', n=1, expand=True)
+    minutes = pd.to_numeric(parts[0], errors='coerce')
+    if parts.shape[1] > 1:
+        minutes = minutes + pd.to_numeric(parts[1], errors='coerce').fillna(0) / 60
+    return minutes.astype('float32')
+
+# Clean a games_details.csv chunk: drop the DNP rows, then store minutes and stats in compact dtypes
+def clean_games_details(games_details_df):
+    ## Game details --> drop NaN values from columns MIN and PLUS_MINUS
+    games_details_df = games_details_df.dropna(subset=['MIN', 'PLUS_MINUS'])
+    games_details_df = games_details_df.assign(MIN=parse_minutes(games_details_df['MIN']))
+    for col in STATS_COLUMNS + SHOOTING_COLUMNS:
+        if not games_details_df[col].isna().any():
+            games_details_df[col] = pd.to_numeric(games_details_df[col], downcast='integer')
+    return games_details_df
+
+# Stream games_details.csv (a path or a buffer) in chunks, cleaning each one so that peak memory stays bounded
+def read_games_details(path, chunksize=CSV_CHUNKSIZE):
+    read_args = {'usecols': list(GAMES_DETAILS_SCHEMA), 'dtype': GAMES_DETAILS_SCHEMA}
+    category_columns = [col for col, dtype in GAMES_DETAILS_SCHEMA.items() if dtype == 'category']
+    if not chunksize:
+        games_details_df = clean_games_details(pd.read_csv(path, **read_args))
+    else:
+        chunks = [clean_games_details(chunk) for chunk in pd.read_csv(path, chunksize=chunksize, **read_args)]
+        ## Align the categories of every chunk, otherwise concat falls back to object columns
+        for col in category_columns:
+            categories = union_categoricals([chunk[col] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[col] = chunk[col].cat.set_categories(categories)
+        games_details_df = pd.concat(chunks, ignore_index=True)
+        ## Chunks can disagree on the integer downcast, redo it on the whole column
+        for col in STATS_COLUMNS + SHOOTING_COLUMNS:
+            if pd.api.types.is_integer_dtype(games_details_df[col].dtype):
+                games_details_df[col] = pd.to_numeric(games_details_df[col], downcast='integer')
+    ## Neither read_csv (it parses large files in internal blocks) nor union_categoricals sorts the categories.
+    ## Code order is alphabetical order from here on: the player index and the name search rely on it
+    for col in category_columns:
+        games_details_df[col] = games_details_df[col].cat.reorder_categories(sorted(games_details_df[col].cat.categories))
+    return games_details_df
+
+# Read the source CSVs used to build games_full_df, only the needed columns
+@timed('read_source_data')
+def read_source_data(dataset_dir):
+    teams_df, games_df = read_teams_and_games(dataset_dir)
+    games_details_df = read_games_details(os.path.join(dataset_dir, 'games_details.csv'))
+    return teams_df, games_df, games_details_df
+
+# teams.csv and games.csv are small, they are always read whole
+def read_teams_and_games(dataset_dir):
+    teams_df = pd.read_csv(os.path.join(dataset_dir, 'teams.csv'), usecols=list(TEAMS_SCHEMA), dtype=TEAMS_SCHEMA)
+    games_df = pd.read_csv(os.path.join(dataset_dir, 'games.csv'))
+    return teams_df, games_df
+
+# Header line of a CSV and the complete lines appended after the byte offset.
+# A trailing line that is still being written is left for the next read
+def read_appended_rows(path, offset):
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read()
+    return header, tail[:tail.rfind(b'\n') + 1]
+
+# Digest of the header line and of the CHECKPOINT_BYTES before the offset. It changes when the rows already
+# ingested are rewritten, e.g. new rows inserted at the top of the file, which is then no plain append
+def file_checkpoint(path, offset):
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = max(len(header), offset - CHECKPOINT_BYTES)
+        f.seek(start)
+        block = f.read(max(offset - start, 0))
+    return hashlib.sha1(header + b'\0' + block).hexdigest()
+
+# Checkpoints of the appendable files at the offsets ingested so far
+def source_checkpoints(dataset_dir, sources):
+    return {name: file_checkpoint(os.path.join(dataset_dir, name), sources[name][0]) for name in APPENDABLE_FILES}
+
+# Bytes of the tail the offset can move past: up to the first line whose game is not in games.csv yet, the merge
+# would drop it, so it stays after the offset and is read again at the next refresh. Lines ending before
+# skip_until already waited PENDING_REFRESHES refreshes, they are passed over even if their game is still missing
+def ingested_length(header, tail, game_ids, skip_until=0):
+    ids = pd.read_csv(io.BytesIO(header + tail), usecols=['GAME_ID'])['GAME_ID']
+    line_ends = np.flatnonzero(np.frombuffer(tail, dtype=np.uint8) == ord('\n'))
+    ## Quoted newlines or blank lines: rows do not map to lines, take the whole tail
+    if len(ids) != len(line_ends):
+        return len(tail)
+    waiting = np.flatnonzero(~ids.isin(game_ids).to_numpy() & (line_ends >= skip_until))
+    if not len(waiting):
+        return len(tail)
+    return line_ends[waiting[0] - 1] + 1 if waiting[0] else 0
 
 # Data cleaning
-## Teams dataset --> fill NaN ARENA CAPACITY values to 0
-teams_df['ARENACAPACITY'].fillna(0, inplace=True)
-## Games dataset --> drop NaN values
-games_df.dropna(inplace=True)
-## Game details --> drop NaN values from columns MIN and PLUS_MINUS, set NaN values to N/A in NICKNAME, START_POSITION and COMMENT columns
-games_details_df.dropna(subset=['MIN'],inplace=True)
-games_details_df['NICKNAME'].fillna('N/A', inplace=True)
-games_details_df['START_POSITION'].fillna('N/A', inplace=True)
-games_details_df['COMMENT'].fillna('N/A', inplace=True)
-games_details_df.dropna(subset=['PLUS_MINUS'], inplace=True)
+@timed('clean_data')
+def clean_data(teams_df, games_df, games_details_df):
+    ## Games dataset --> drop NaN values
+    games_df = games_df.dropna()[list(GAMES_SCHEMA)].astype(GAMES_SCHEMA)
+    ## Game details are cleaned while they are read, see clean_games_details
+    return teams_df, games_df, games_details_df
+
+# Key of a box score line: one player in one game
+def box_score_keys(df, n_players):
+    return df['GAME_ID'].to_numpy(np.int64) * n_players + df['PLAYER_NAME'].cat.codes.to_numpy(np.int64)
 
 # Data merge
-## Include season information
-games_full_df = pd.merge(games_details_df, games_df[['SEASON','GAME_ID']], how='inner', left_on='GAME_ID', right_on='GAME_ID')
-games_full_df.rename(columns={'NICKNAME': 'PLAYER_NICKNAME'}, inplace=True)
-## Include Teams Nickname
-games_full_df = pd.merge(games_full_df, teams_df[['TEAM_ID', 'NICKNAME']], how='inner', left_on='TEAM_ID', right_on='TEAM_ID')
-games_full_df.rename(columns={'NICKNAME': 'TEAM'}, inplace=True)
+@timed('merge_data')
+def merge_data(teams_df, games_df, games_details_df):
+    ## Include season information
+    games_full_df = pd.merge(games_details_df, games_df, how='inner', on='GAME_ID')
+    ## Include Teams Nickname
+    games_full_df = pd.merge(games_full_df, teams_df, how='inner', on='TEAM_ID')
+    games_full_df.rename(columns={'NICKNAME': 'TEAM'}, inplace=True)
+    games_full_df['TEAM'] = games_full_df['TEAM'].cat.remove_unused_categories()
+    games_full_df['TEAM'] = games_full_df['TEAM'].cat.reorder_categories(sorted(games_full_df['TEAM'].cat.categories))
+    ## One line per player and game: the sources repeat some box scores, and some games in games.csv
+    keys = box_score_keys(games_full_df, len(games_full_df['PLAYER_NAME'].cat.categories))
+    return games_full_df[~pd.Series(keys).duplicated().to_numpy()].reset_index(drop=True)
+
+# Sort games_full_df by player, season and game date, then number the games of every player season
+@timed('sort_by_player_season')
+def sort_by_player_season(df):
+    df = df.sort_values(PLAYER_INDEX_ORDER, ignore_index=True)
+    starts, stops = player_season_bounds(df)
+    game_number = np.arange(len(df)) - np.repeat(starts, stops - starts)
+    return df.assign(GAME_NUMBER=pd.to_numeric(game_number, downcast='integer'))
+
+# Row bounds of every (player, season) block of a table sorted by sort_by_player_season
+def player_season_bounds(df):
+    codes = df['PLAYER_NAME'].cat.codes.to_numpy()
+    seasons = df['SEASON'].to_numpy()
+    boundaries = np.flatnonzero((codes[1:] != codes[:-1]) | (seasons[1:] != seasons[:-1])) + 1
+    return np.r_[0, boundaries], np.r_[boundaries, len(df)]
+
+# Offset table of the sorted games_full_df: (player, season) --> (start, stop) row range, and player --> seasons
+@timed('build_player_index')
+def build_player_index(df):
+    starts, stops = player_season_bounds(df)
+    players = df['PLAYER_NAME'].to_numpy()[starts].tolist()
+    seasons = df['SEASON'].to_numpy()[starts].tolist()
+    ranges = {}
+    player_seasons = {}
+    for player, season, start, stop in zip(players, seasons, starts.tolist(), stops.tolist()):
+        ranges[(player, season)] = (start, stop)
+        player_seasons.setdefault(player, []).append(season)
+    return {'ranges': ranges, 'players': player_seasons}
+
+# Games of a player in a season, in date order, as a zero-copy slice of games_full_df
+@timed('data')
+def player_season_games(df, player_index, player, season):
+    start, stop = player_index['ranges'].get((player, int(season)), (0, 0))
+    return df.iloc[start:stop]
+
+# Cumulative sums of the stats with a leading zero row, so that any run of rows [lo, hi) sums to cumsum[hi] - cumsum[lo].
+# Counts of the non-NaN values are only kept when some stat is missing, otherwise they are hi - lo
+def build_range_sums(stats):
+    ## Accumulated in place, column by column, so that no other copy of the stats is allocated
+    cumsum = np.zeros((len(stats) + 1, len(STATS_COLUMNS)))
+    for i, col in enumerate(STATS_COLUMNS):
+        cumsum[1:, i] = stats[col].to_numpy()
+    present = ~np.isnan(cumsum[1:])
+    counts = None
+    if not present.all():
+        counts = np.zeros(cumsum.shape, dtype=np.int32)
+        np.cumsum(present, axis=0, out=counts[1:])
+        cumsum[1:][~present] = 0
+    np.cumsum(cumsum[1:], axis=0, out=cumsum[1:])
+    return cumsum, counts
+
+# Range index over a table made of contiguous blocks (one per value of the categorical keys), each block in date order,
+# from the range sums of the table when they were already built
+def build_range_index(keys, dates, stats, sums=None):
+    codes = keys.cat.codes.to_numpy()
+    boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts, stops = np.r_[0, boundaries], np.r_[boundaries, len(codes)]
+    cumsum, counts = sums if sums is not None else build_range_sums(stats)
+    return {
+        'bounds': dict(zip(keys.cat.categories[codes[starts]].tolist(), zip(starts.tolist(), stops.tolist()))) if len(codes) else {},
+        'dates': dates,
+        'cumsum': cumsum,
+        'counts': counts,
+    }
+
+# Range indexes for the trends: one over the games of every player (games_full_df is already sorted by player
+# and date) and one over the game totals of every team, plus the first day of every season for the date slider
+@timed('build_trend_index')
+def build_trend_index(df, rollups, player_sums=None):
+    players = build_range_index(df['PLAYER_NAME'], df['GAME_DATE_EST'].to_numpy().view(np.int64), df, player_sums)
+    game_dates = pd.Series(df['GAME_DATE_EST'].to_numpy(), index=df['GAME_ID'].to_numpy())
+    team_games = rollups['season_team_game']['sum'].reset_index()
+    team_games['GAME_DATE_EST'] = game_dates[~game_dates.index.duplicated()].reindex(team_games['GAME_ID']).to_numpy()
+    team_games['TEAM'] = team_games['TEAM'].astype('category')
+    team_games = team_games.sort_values(['TEAM', 'GAME_DATE_EST', 'GAME_ID'], ignore_index=True)
+    teams = build_range_index(team_games['TEAM'], team_games['GAME_DATE_EST'].to_numpy().view(np.int64), team_games)
+    season_days = team_games.groupby('SEASON')['GAME_DATE_EST'].agg(['min', 'max']).astype(np.int64) // NANOSECONDS_PER_DAY
+    return {
+        'players': players,
+        'teams': teams,
+        'seasons': season_days['min'].to_dict(),
+        'days': (int(season_days['min'].min()), int(season_days['max'].max())) if len(season_days) else (0, 0),
+    }
+
+# Rows [lo, hi) of a key whose date falls between two days (both included): two binary searches in its block
+def range_rows(range_index, key, start_day, end_day):
+    start, stop = range_index['bounds'].get(key, (0, 0))
+    dates = range_index['dates'][start:stop]
+    lo = start + np.searchsorted(dates, start_day * NANOSECONDS_PER_DAY, side='left')
+    hi = start + np.searchsorted(dates, (end_day + 1) * NANOSECONDS_PER_DAY, side='left')
+    return start, lo, hi
+
+# Totals, games and averages of a key between two days, from two rows of the cumulative sums
+@timed('data')
+def range_aggregates(range_index, key, start_day, end_day):
+    _, lo, hi = range_rows(range_index, key, start_day, end_day)
+    sums = range_index['cumsum'][hi] - range_index['cumsum'][lo]
+    counts = range_index['counts'][hi] - range_index['counts'][lo] if range_index['counts'] is not None else np.full(len(STATS_COLUMNS), hi - lo)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return pd.DataFrame({'SUM': sums, 'COUNT': counts, 'MEAN': means}, index=STATS_COLUMNS)
+
+# Average of the last window games at every game of a key between two days. The window may reach back before the
+# start day but not before the first game of the key; every point is one difference of the cumulative sums
+@timed('data')
+def rolling_averages(range_index, key, start_day, end_day, window):
+    first, lo, hi = range_rows(range_index, key, start_day, end_day)
+    stops = np.arange(lo + 1, hi + 1)
+    starts = np.maximum(stops - int(window), first)
+    sums = range_index['cumsum'][stops] - range_index['cumsum'][starts]
+    counts = range_index['counts'][stops] - range_index['counts'][starts] if range_index['counts'] is not None else (stops - starts)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    table = pd.DataFrame(means, columns=STATS_COLUMNS)
+    table.insert(0, 'GAME_DATE_EST', range_index['dates'][lo:hi].view('datetime64[ns]'))
+    return table
+
+# Per game stat vectors of every player season of the sorted games_full_df, one reduceat per column over the
+# (player, season) blocks. The matrix holds the features z-scored over the seasons with enough games
+@timed('build_similarity_index')
+def build_similarity_index(df, min_games=SIMILARITY_MIN_GAMES):
+    starts, stops = player_season_bounds(df) if len(df) else (np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+    games = stops - starts
+    sums = {col: np.add.reduceat(np.nan_to_num(df[col].to_numpy(dtype=np.float64)), starts) if len(df) else np.zeros(0)
+            for col in STATS_COLUMNS + SHOOTING_COLUMNS + ['MIN']}
+    seasons = pd.DataFrame({
+        'PLAYER_NAME': df['PLAYER_NAME'].to_numpy()[starts],
+        'SEASON': df['SEASON'].to_numpy()[starts],
+        'GAMES': games,
+    })
+    for col in STATS_COLUMNS + ['MIN']:
+        seasons[col] = sums[col] / games
+    ## No attempts in a season counts as 0%
+    for col, made, attempted in (('FG_PCT', 'FGM', 'FGA'), ('FG3_PCT', 'FG3M', 'FG3A'), ('FT_PCT', 'FTM', 'FTA')):
+        seasons[col] = np.divide(sums[made], sums[attempted], out=np.zeros(len(games)), where=sums[attempted] > 0)
+    eligible = games >= min_games
+    features = seasons[SIMILARITY_FEATURES].to_numpy()
+    reference = features[eligible] if eligible.any() else features
+    mean = reference.mean(axis=0) if len(reference) else 0
+    std = reference.std(axis=0) if len(reference) else 1
+    matrix = np.ascontiguousarray((features - mean) / np.where(std > 0, std, 1), dtype=np.float32)
+    return {
+        'seasons': seasons,
+        'matrix': matrix,
+        'norms': np.einsum('ij,ij->i', matrix, matrix),
+        'eligible': eligible,
+        'players': df['PLAYER_NAME'].cat.codes.to_numpy()[starts],
+    }
+
+# Similarity index from its cached parts, with the (player, season) --> matrix row lookup
+def load_similarity_index(indexes):
+    similarity = {name: indexes[f'similarity_{name}'] for name in SIMILARITY_PARTS}
+    seasons = similarity['seasons']
+    similarity['rows'] = {key: row for row, key in enumerate(zip(seasons['PLAYER_NAME'].tolist(), seasons['SEASON'].tolist()))}
+    return similarity
+
+# k nearest eligible seasons of a batch of query rows of the similarity matrix, by Euclidean distance.
+# Distances come from one matrix product, |q|^2 - 2 q.x + |x|^2; the seasons of the query player are skipped
+@timed('data')
+def nearest_seasons(similarity, rows, k):
+    rows = np.asarray(rows)
+    distances = similarity['norms'][None, :] - 2 * (similarity['matrix'][rows] @ similarity['matrix'].T) + similarity['norms'][rows][:, None]
+    distances[:, ~similarity['eligible']] = np.inf
+    distances[similarity['players'][None, :] == similarity['players'][rows][:, None]] = np.inf
+    k = min(k, int(np.isfinite(distances).sum(axis=1).min()) if len(rows) else 0)
+    if k == 0:
+        return np.zeros((len(rows), 0), dtype=int), np.zeros((len(rows), 0))
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+    order = np.argsort(nearest_distances, axis=1, kind='stable')
+    nearest = np.take_along_axis(nearest, order, axis=1)
+    return nearest, np.sqrt(np.maximum(np.take_along_axis(nearest_distances, order, axis=1), 0))
+
+# Top k comparables of a player season, formatted for the similar seasons table
+def similar_seasons_table(similarity, player, season, k):
+    row = similarity['rows'].get((player, int(season)))
+    if row is None:
+        return []
+    nearest, distances = nearest_seasons(similarity, [row], int(k))
+    table = similarity['seasons'].iloc[nearest[0]].copy()
+    table.insert(0, 'RANK', np.arange(1, len(table) + 1))
+    table['DISTANCE'] = distances[0].astype(np.float64)
+    table['PLAYER_NAME'] = table['PLAYER_NAME'].astype(str)
+    return table[[col['id'] for col in SIMILAR_COLUMNS]].round(decimals=FIGURE_DECIMALS + 1).to_dict('records')
+
+# Search index over the player names: sorted (token, name id) pairs for prefix search on the full name
+# and on each word, plus a trigram posting list for substring search
+@timed('build_name_index')
+def build_name_index(names):
+    lowered = [name.lower() for name in names]
+    prefixes = sorted((token, i) for i, name in enumerate(lowered) for token in {name, *name.split()})
+    trigrams = {}
+    for i, name in enumerate(lowered):
+        for j in range(len(name) - 2):
+            trigrams.setdefault(name[j:j + 3], set()).add(i)
+    return {'names': names, 'lowered': lowered, 'prefix_keys': [token for token, _ in prefixes], 'prefix_ids': [i for _, i in prefixes], 'trigrams': trigrams}
+
+# Names matching the query: prefix matches first, then substring matches, in alphabetical order
+@timed('data')
+def search_names(name_index, query, limit=PLAYER_SEARCH_LIMIT):
+    query = query.strip().lower()
+    if not query:
+        return []
+    lo = bisect_left(name_index['prefix_keys'], query)
+    hi = bisect_left(name_index['prefix_keys'], query + '\uffff')
+    matches = sorted(set(name_index['prefix_ids'][lo:hi]))[:limit]
+    if len(matches) < limit and len(query) >= 3:
+        postings = [name_index['trigrams'].get(query[j:j + 3], set()) for j in range(len(query) - 2)]
+        candidates = set.intersection(*postings) - set(matches)
+        matches += sorted(i for i in candidates if query in name_index['lowered'][i])[:limit - len(matches)]
+    return [name_index['names'][i] for i in matches]
+
+# Sorted unique values shown by the layout dropdowns
+def build_dropdown_values(df):
+    return {col: np.sort(np.asarray(df[col].unique())).tolist() for col in DROPDOWN_COLUMNS}
+
+# Size and mtime of every source CSV
+def source_stats(dataset_dir):
+    stats = {}
+    for name in SOURCE_FILES:
+        stat = os.stat(os.path.join(dataset_dir, name))
+        stats[name] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+# Fingerprint of the source CSVs (name, size, mtime), of the cache layout version and of the settings of the cached indexes
+def source_fingerprint(dataset_dir, stats=None):
+    stats = stats or source_stats(dataset_dir)
+    digest = hashlib.sha1(f'v{CACHE_VERSION}:{SIMILARITY_MIN_GAMES}'.encode())
+    for name in SOURCE_FILES:
+        size, mtime = stats[name]
+        digest.update(f'{name}:{size}:{mtime}'.encode())
+    return digest.hexdigest()
+
+# Write the columns of a table as one .npy file each, string columns are stored as codes plus categories.
+# Returns their manifest entries
+def write_columns(df, directory, prefix):
+    columns = []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        entry = {'name': col, 'file': f'{prefix}_{i}.npy'}
+        if not (pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_datetime64_dtype(values.dtype)):
+            values = values.astype('category')
+            np.save(os.path.join(directory, entry['file']), values.cat.codes.to_numpy())
+            entry['categories'] = values.cat.categories.tolist()
+        else:
+            np.save(os.path.join(directory, entry['file']), values.to_numpy())
+        columns.append(entry)
+    return columns
+
+# Read back the columns written by write_columns.
+# With mmap the columns stay backed by the read-only .npy files, nothing is copied into the process
+def read_columns(directory, columns, mmap):
+    data = {}
+    for entry in columns:
+        values = np.load(os.path.join(directory, entry['file']), mmap_mode='r' if mmap else None)
+        ## The codes come from write_columns, valid and in the dtype pandas picks for these categories: from_codes
+        ## wraps the memory-mapped array as it is, without scanning or copying it
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(entry['categories']), validate=False)
+        data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+# Write games_full_df and its cached indexes (see build_cached_indexes) in cache_dir/<fingerprint>/.
+# A version is never modified once written, readers may keep it memory-mapped
+@timed('write_cache')
+def write_cache(df, dropdown_values, indexes, fingerprint, cache_dir):
+    version_dir = os.path.join(cache_dir, fingerprint)
+    tmp_dir = os.path.join(cache_dir, f'.tmp-{fingerprint}-{os.getpid()}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns = write_columns(df, tmp_dir, 'col')
+    rollups = {level: {agg: write_columns(table.reset_index(), tmp_dir, f'rollup_{level}_{agg}') for agg, table in tables.items()}
+               for level, tables in indexes['rollups'].items()}
+    tables = {}
+    arrays = {}
+    for name, values in indexes.items():
+        if name == 'rollups':
+            continue
+        if isinstance(values, pd.DataFrame):
+            tables[name] = write_columns(values, tmp_dir, name)
+            continue
+        arrays[name] = None if values is None else f'{name}.npy'
+        if values is not None:
+            np.save(os.path.join(tmp_dir, arrays[name]), values)
+    manifest = {'fingerprint': fingerprint, 'rows': len(df), 'columns': columns, 'rollups': rollups, 'tables': tables, 'arrays': arrays,
+                'dropdowns': dropdown_values}
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, default=int)
+    ## Publish the complete version with one rename, the process that wrote the same version first wins
+    try:
+        os.rename(tmp_dir, version_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(version_dir, 'manifest.json')):
+            raise
+
+# Read a cache version back as (games_full_df, dropdown values, cached indexes), None when it is missing or built
+# from different source files. With mmap every worker maps the same pages instead of keeping its own copy
+@timed('read_cache')
+def read_cache(cache_dir, fingerprint, mmap=CACHE_MMAP):
+    version_dir = os.path.join(cache_dir, fingerprint)
+    try:
+        with open(os.path.join(version_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest['fingerprint'] != fingerprint:
+        return None
+    try:
+        df = read_columns(version_dir, manifest['columns'], mmap)
+        indexes = {'rollups': {level: {agg: read_columns(version_dir, columns, mmap).set_index(ROLLUP_LEVELS[level])
+                                       for agg, columns in tables.items()}
+                               for level, tables in manifest['rollups'].items()}}
+        for name, columns in manifest['tables'].items():
+            indexes[name] = read_columns(version_dir, columns, mmap)
+        for name, file in manifest['arrays'].items():
+            indexes[name] = None if file is None else np.load(os.path.join(version_dir, file), mmap_mode='r' if mmap else None)
+    except OSError:
+        return None
+    return df, manifest['dropdowns'], indexes
+
+# Remove the cache versions not in keep, and the single directory layout of older releases.
+# Temporary directories are left alone, they may belong to a process that is still writing
+def prune_cache(cache_dir, keep):
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name in keep or name.startswith('.'):
+            continue
+        if os.path.isdir(path) and len(name) == 40 and all(c in '0123456789abcdef' for c in name):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name == 'manifest.json' or (name.startswith('col_') and name.endswith('.npy')):
+            os.remove(path)
+
+# Load games_full_df, the dropdown values and the cached indexes, from the columnar cache when it is still valid
+def load_dataset(dataset_dir=DATASET_DIR, cache_dir=CACHE_DIR, rebuild=False, mmap=CACHE_MMAP, stats=None):
+    fingerprint = source_fingerprint(dataset_dir, stats)
+    cached = None if rebuild else read_cache(cache_dir, fingerprint, mmap)
+    if cached is not None:
+        return cached
+    games_full_df = sort_by_player_season(merge_data(*clean_data(*read_source_data(dataset_dir))))
+    dropdown_values = build_dropdown_values(games_full_df)
+    return save_dataset(games_full_df, dropdown_values, build_cached_indexes(games_full_df), fingerprint, cache_dir, mmap)
+
+# Write the dataset cache and return the tables to serve: the memory-mapped copies when mmap is on
+def save_dataset(games_full_df, dropdown_values, indexes, fingerprint, cache_dir=CACHE_DIR, mmap=CACHE_MMAP):
+    try:
+        write_cache(games_full_df, dropdown_values, indexes, fingerprint, cache_dir)
+    except OSError as e:
+        logger.warning('Unable to write dataset cache in %s: %s', cache_dir, e)
+        return games_full_df, dropdown_values, indexes
+    ## Serve the memory-mapped copy, not the private one that was just built
+    if mmap:
+        cached = read_cache(cache_dir, fingerprint, mmap)
+        if cached is None:
+            raise OSError(f'Dataset cache {fingerprint} is missing from {cache_dir} right after it was written')
+        return cached
+    return games_full_df, dropdown_values, indexes
+
+# Indexes stored with games_full_df in the cache, so that the worker processes map them instead of each building
+# its own: the rollups, the cumulative sums of the player trends, as large as the table itself, and the similarity matrix
+def build_cached_indexes(games_full_df, rollups=None):
+    player_cumsum, player_counts = build_range_sums(games_full_df)
+    similarity = build_similarity_index(games_full_df)
+    return {
+        'rollups': rollups if rollups is not None else build_rollups(games_full_df),
+        'player_cumsum': player_cumsum,
+        'player_counts': player_counts,
+        **{f'similarity_{name}': similarity[name] for name in SIMILARITY_PARTS},
+    }
+
+# Everything the callbacks read, built from games_full_df and its cached indexes. A refresh builds a new one and
+# swaps it in whole, so a callback that took DATA once works on a single consistent version
+def build_dashboard_data(games_full_df, dropdown_values, indexes, sources, checkpoints, pending=None):
+    rollups = indexes['rollups']
+    player_index = build_player_index(games_full_df)
+    ## Player dropdowns, already in alphabetical order
+    player_names = list(player_index['players'])
+    return {
+        'games': games_full_df,
+        'dropdowns': dropdown_values,
+        'sources': sources,
+        ## Digests of the appendable files at the ingested offsets, see file_checkpoint
+        'checkpoints': checkpoints,
+        ## Box score lines after the offset waiting for their game: {'offset', 'end', 'refreshes'}, see ingest_appended_rows
+        'pending': pending,
+        'version': source_fingerprint(None, sources),
+        ## Precomputed season/team/player/game rollups, callbacks only read from them
+        'rollups': rollups,
+        ## Row ranges of every player season in games_full_df, for the per-match lookups
+        'player_index': player_index,
+        'player_names': player_names,
+        ## Player dropdowns search this index on the server instead of shipping every name in the layout
+        'name_index': build_name_index(player_names),
+        ## Top LEADERBOARD_SIZE players per season and stat, for totals and per game averages
+        'leaderboards': build_leaderboards(rollups),
+        ## Cumulative sums per player and per team, for any date range in constant time
+        'trends': build_trend_index(games_full_df, rollups, (indexes['player_cumsum'], indexes['player_counts'])),
+        ## Normalized per game stat vectors of every player season, for the similar seasons search
+        'similarity': load_similarity_index(indexes),
+    }
+
+# Append the delta CSVs of a directory (games.csv and/or games_details.csv, with headers) to the source files,
+# which stay the only source of truth. Every delta is read and checked before the first one is appended,
+# ValueError when one cannot be parsed or misses a column of its source file
+def append_delta_files(delta_dir, dataset_dir):
+    deltas = {}
+    for name in APPENDABLE_FILES:
+        delta_path = os.path.join(delta_dir, name)
+        if not os.path.exists(delta_path):
+            continue
+        with open(os.path.join(dataset_dir, name)) as f:
+            columns = f.readline().strip().split(',')
+        delta_df = pd.read_csv(delta_path, dtype=str)
+        missing = [col for col in columns if col not in delta_df.columns]
+        if missing:
+            raise ValueError(f"{delta_path} misses the columns {', '.join(missing)}")
+        deltas[name] = delta_df[columns]
+    for name, delta_df in deltas.items():
+        delta_df.to_csv(os.path.join(dataset_dir, name), mode='a', header=False, index=False)
+
+# Clean and merge only the rows appended to games_details.csv, then add them to the current data.
+# The data is returned as it was, with the new offsets, when no new box score was ingested
+@timed('ingest_appended_rows')
+def ingest_appended_rows(data, dataset_dir, stats):
+    old_offset = data['sources']['games_details.csv'][0]
+    header, tail = read_appended_rows(os.path.join(dataset_dir, 'games_details.csv'), old_offset)
+    teams_df, games_df = read_teams_and_games(dataset_dir)
+    ## Lines that waited long enough for their game are passed over, a full reload would drop them too
+    held = data['pending']
+    expired = held is not None and held['offset'] == old_offset and held['refreshes'] >= PENDING_REFRESHES
+    length = ingested_length(header, tail, games_df['GAME_ID'], held['end'] - old_offset if expired else 0) if tail else 0
+    ## Remember where the ingested lines end, the rest is read again at the next refresh
+    offset = old_offset + length
+    pending = None
+    if length < len(tail):
+        same = held is not None and held['offset'] == offset
+        pending = {**held, 'refreshes': held['refreshes'] + 1} if same else {'offset': offset, 'end': old_offset + len(tail), 'refreshes': 1}
+    sources = {**stats, 'games_details.csv': (offset, stats['games_details.csv'][1])}
+    unchanged = {**data, 'sources': sources, 'checkpoints': source_checkpoints(dataset_dir, sources), 'pending': pending}
+    if not tail:
+        return unchanged
+    ## The lines after a waiting one are ingested now, the box scores they add are dropped when they are read again
+    delta_df = merge_data(*clean_data(teams_df, games_df, read_games_details(io.BytesIO(header + tail), chunksize=0)))
+    if delta_df.empty:
+        return unchanged
+    games_full_df = data['games'].drop(columns='GAME_NUMBER')
+    ## Same categories on both sides, sorted so that the players stay in alphabetical order
+    for col in ('PLAYER_NAME', 'TEAM'):
+        categories = games_full_df[col].cat.categories.union(delta_df[col].cat.categories)
+        games_full_df[col] = games_full_df[col].cat.set_categories(categories)
+        delta_df[col] = delta_df[col].cat.set_categories(categories)
+    ## Drop the box scores already ingested, merge_data already dropped the repeated ones of the delta itself
+    n_players = len(games_full_df['PLAYER_NAME'].cat.categories)
+    delta_df = delta_df[~np.isin(box_score_keys(delta_df, n_players), box_score_keys(games_full_df, n_players))]
+    if delta_df.empty:
+        return unchanged
+    games_full_df = sort_by_player_season(pd.concat([games_full_df, delta_df[games_full_df.columns]], ignore_index=True))
+    rollups = merge_rollups(data['rollups'], build_rollups(delta_df))
+    dropdown_values = {col: sorted(set(data['dropdowns'][col]) | set(delta_df[col].unique().tolist())) for col in DROPDOWN_COLUMNS}
+    games_full_df, dropdown_values, indexes = save_dataset(games_full_df, dropdown_values, build_cached_indexes(games_full_df, rollups),
+                                                           source_fingerprint(None, sources))
+    return build_dashboard_data(games_full_df, dropdown_values, indexes, sources, unchanged['checkpoints'], pending)
+
+# Take the lock file of the cache directory without waiting: the open file holds it until it is closed,
+# None when another process holds it
+def try_refresh_lock(cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    lock_file = open(os.path.join(cache_dir, 'refresh.lock'), 'w')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+    return lock_file
+
+# Record the version now served from the cache, and what it was built from, for the other processes
+def publish_dataset(data, cache_dir=CACHE_DIR):
+    current = {'fingerprint': data['version'], 'sources': data['sources'], 'checkpoints': data['checkpoints'], 'pending': data['pending']}
+    tmp_path = os.path.join(cache_dir, f'.current-{os.getpid()}.json')
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(current, f)
+        os.replace(tmp_path, os.path.join(cache_dir, 'current.json'))
+    except OSError as e:
+        logger.error('Unable to publish dataset version in %s: %s', cache_dir, e)
+
+# Swap in the version published by another process, memory-mapped from its cache directory.
+# None when this process already serves it, 'failed' when the published version cannot be read
+def adopt_published_dataset(cache_dir=CACHE_DIR):
+    global DATA
+    try:
+        with open(os.path.join(cache_dir, 'current.json')) as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        return None
+    sources = {name: tuple(stat) for name, stat in current['sources'].items()}
+    ## Same rows, only the offsets moved: take them so that this process does not check the same bytes again
+    if current['fingerprint'] == DATA['version']:
+        if sources != DATA['sources']:
+            DATA = {**DATA, 'sources': sources, 'checkpoints': current['checkpoints'], 'pending': current['pending']}
+        return None
+    cached = read_cache(cache_dir, current['fingerprint'])
+    if cached is None:
+        logger.error('Published dataset version %s is missing from %s', current['fingerprint'], cache_dir)
+        return 'failed'
+    DATA = build_dashboard_data(*cached, sources, current['checkpoints'], pending=current['pending'])
+    return 'reloaded'
+
+# Pick up the new rows of the source CSVs, optionally appending the files of a delta directory first,
+# and swap the new data in. Rows appended to games.csv and games_details.csv are ingested incrementally,
+# any other change of the sources reloads everything. One process at a time refreshes and publishes the
+# new cache version, the others take it from the cache
+def refresh_dataset(dataset_dir=DATASET_DIR, delta_dir=None, cache_dir=CACHE_DIR):
+    global DATA
+    with REFRESH_LOCK:
+        status = adopt_published_dataset(cache_dir)
+        lock_file = try_refresh_lock(cache_dir)
+        if lock_file is None:
+            return status or 'busy'
+        try:
+            ## Another process may have published a version while this one waited for the lock
+            status = adopt_published_dataset(cache_dir) or status
+            if delta_dir:
+                try:
+                    append_delta_files(delta_dir, dataset_dir)
+                except (OSError, ValueError):
+                    logger.exception('Delta files of %s not appended', delta_dir)
+                    return 'failed'
+            data = DATA
+            stats = source_stats(dataset_dir)
+            old = data['sources']
+            if stats == old:
+                return status or 'unchanged'
+            ## Appended only if the bytes already ingested did not change
+            appended = stats['teams.csv'] == old['teams.csv'] and all(
+                stats[name] == old[name] or (stats[name][0] > old[name][0]
+                    and file_checkpoint(os.path.join(dataset_dir, name), old[name][0]) == data['checkpoints'][name])
+                for name in APPENDABLE_FILES)
+            try:
+                if appended:
+                    new_data = ingest_appended_rows(data, dataset_dir, stats)
+                    status = 'incremental' if new_data['games'] is not data['games'] else status or 'unchanged'
+                else:
+                    new_data = build_dashboard_data(*load_dataset(dataset_dir, cache_dir, rebuild=True, stats=stats), stats,
+                                                    source_checkpoints(dataset_dir, stats))
+                    status = 'full'
+            except OSError:
+                logger.exception('Dataset refresh failed, keeping version %s', data['version'])
+                return 'failed'
+            publish_dataset(new_data, cache_dir)
+            if new_data['version'] != data['version']:
+                prune_cache(cache_dir, keep={new_data['version'], data['version']})
+            DATA = new_data
+            return status
+        finally:
+            lock_file.close()
+
+# Check the source CSVs every interval seconds from a daemon thread of the current process
+def start_refresh_watcher(interval=REFRESH_INTERVAL):
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_dataset()
+            except Exception:
+                logger.exception('Dataset refresh failed')
+    if interval > 0:
+        threading.Thread(target=watch, name='dataset-refresh', daemon=True).start()
+
+# In-process LRU store for callback outputs
+class MemoryFigureCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {'backend': 'memory', 'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+# Callback output as plain data: figures become their JSON dict, which Dash takes as it is and which unpickles
+# without running the Plotly validation of every trace again
+def plain_output(value):
+    if isinstance(value, go.Figure):
+        return value.to_plotly_json()
+    if isinstance(value, tuple):
+        return tuple(plain_output(item) for item in value)
+    return value
+
+# Local disk store for callback outputs, shared by every worker process on the same box.
+# One pickle per key, the file mtime is the LRU clock
+class DiskFigureCache:
+    def __init__(self, max_entries, cache_dir):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.pkl')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        path = self.path(key)
+        tmp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(plain_output(value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with os.scandir(self.cache_dir) as it:
+            files = [entry for entry in it if entry.name.endswith('.pkl')]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def stats(self):
+        return {'backend': 'disk', 'entries': len(os.listdir(self.cache_dir)), 'hits': self.hits, 'misses': self.misses}
+
+# Create the figure cache for the selected backend, None disables it
+def make_figure_cache(backend=FIGURE_CACHE_BACKEND, max_entries=FIGURE_CACHE_SIZE, cache_dir=FIGURE_CACHE_DIR):
+    if backend == 'memory':
+        return MemoryFigureCache(max_entries)
+    if backend == 'disk':
+        return DiskFigureCache(max_entries, cache_dir)
+    return None
+
+# Memoize a callback on (dataset version, callback name, input values).
+# normalize maps the inputs to the cache key, e.g. to ignore the order of two compared players;
+# version maps them to the dataset version when the function is not working on the current DATA
+def memoize_figures(name, normalize=None, version=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            if FIGURE_CACHE is None:
+                return func(*args)
+            key = (version(*args) if version else DATA['version'], name, normalize(*args) if normalize else args)
+            value = FIGURE_CACHE.get(key)
+            if value is None:
+                value = func(*args)
+                FIGURE_CACHE.set(key, value)
+            return value
+        return wrapper
+    return decorator
+
+# Stats API tables, None when the team or the player is unknown. Aggregates are 'sum' or 'mean'
+def check_agg(agg):
+    if agg not in ('sum', 'mean'):
+        raise ValueError(f"agg must be 'sum' or 'mean', not {agg!r}")
+    return agg
+
+## Season leaders: top_k ranks of every stat, ties included. The leaderboards only hold LEADERBOARD_SIZE ranks
+def api_leaders(data, agg, season, top_k):
+    if not 1 <= top_k <= LEADERBOARD_SIZE:
+        raise ValueError(f'top_k must be between 1 and {LEADERBOARD_SIZE}, not {top_k}')
+    board = data['leaderboards'][check_agg(agg)].get(season)
+    if board is None:
+        return pd.DataFrame(columns=['SEASON', 'STAT', 'RANK', 'PLAYER_NAME', 'TEAM', 'VALUE'])
+    return board.loc[board['RANK'] <= top_k, ['SEASON', 'STAT', 'RANK', 'PLAYER_NAME', 'TEAM', 'VALUE']]
+
+## Team totals or per game averages of every season, for one team or all of them
+def api_team_seasons(data, agg, team):
+    if team is None:
+        return lookup_rollup(data['rollups'], 'season_team', check_agg(agg))
+    if team not in data['dropdowns']['TEAM']:
+        return None
+    return lookup_rollup(data['rollups'], 'season_team', check_agg(agg), TEAM=team)
+
+## Split of a team season between its players
+def api_team_players(data, agg, team, season):
+    if team not in data['dropdowns']['TEAM']:
+        return None
+    return lookup_rollup(data['rollups'], 'season_team_player', check_agg(agg), SEASON=season, TEAM=team)
+
+## Season lines of a player, one row per team he played for
+def api_player_seasons(data, agg, player):
+    if player not in data['player_index']['players']:
+        return None
+    return lookup_rollup(data['rollups'], 'season_team_player', check_agg(agg), PLAYER_NAME=player)
+
+## Per match lines of a player in a season, in date order
+def api_player_games(data, player, season):
+    if player not in data['player_index']['players']:
+        return None
+    return player_season_games(data['games'], data['player_index'], player, season)
+
+API_ENDPOINTS = {
+    'leaders': api_leaders,
+    'team_seasons': api_team_seasons,
+    'team_players': api_team_players,
+    'player_seasons': api_player_seasons,
+    'player_games': api_player_games,
+}
+
+# Columns of a stats API table, None when the team or the player is unknown and ValueError on invalid arguments
+def api_table(data, endpoint, args, columns):
+    table = API_ENDPOINTS[endpoint](data, *args)
+    if table is None or not columns:
+        return table
+    unknown = [col for col in columns if col not in table.columns]
+    if unknown:
+        raise ValueError(f"unknown columns {', '.join(unknown)}, available: {', '.join(table.columns)}")
+    return table[list(columns)]
+
+# Encode a page of a stats API table as JSON (split orientation, with the paging fields) or as an Arrow IPC stream.
+# Returns (body, total rows, gzipped); bodies are memoized like the figures, on the version of data and the arguments
+@memoize_figures('api', normalize=lambda data, *args: args, version=lambda data, *args: data['version'])
+def encode_api_table(data, endpoint, args, columns, offset, limit, fmt, compress):
+    table = api_table(data, endpoint, args, columns)
+    total = len(table)
+    table = table.iloc[offset:offset + limit]
+    ## Only the categories of the page, otherwise every player name would travel with every Arrow dictionary
+    table = table.apply(lambda values: values.cat.remove_unused_categories() if isinstance(values.dtype, pd.CategoricalDtype) else values)
+    if fmt == 'arrow':
+        sink = pa.BufferOutputStream()
+        arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+        with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+        body = sink.getvalue().to_pybytes()
+    else:
+        ## pandas formats the dates and rounds the floats, the paging fields are added to the same object
+        payload = json.loads(table.to_json(orient='split', index=False, date_format='iso', double_precision=API_DECIMALS))
+        body = json.dumps({'total': total, 'offset': offset, 'limit': limit, **payload}).encode()
+    compress = compress and len(body) >= API_GZIP_MIN_BYTES
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+    return body, total, compress
+
+# Serve a stats API table for the current request: ETag and Last-Modified come from the dataset version, so polling
+# clients get a 304 until the next refresh; the body is gzipped when the client accepts it.
+# Every step works on the same data, and a 304 is only sent once the arguments and the resource are checked
+def api_response(endpoint, *args):
+    data = DATA
+    fmt = request.args.get('format') or ('arrow' if request.accept_mimetypes.best_match(list(API_MIMETYPES.values())) == API_MIMETYPES['arrow'] else 'json')
+    if fmt not in API_MIMETYPES:
+        return {'error': f"format must be one of {', '.join(API_MIMETYPES)}"}, 400
+    if fmt == 'arrow' and pa is None:
+        return {'error': 'Arrow responses need pyarrow'}, 406
+    try:
+        columns = tuple(col for col in request.args.get('columns', '').split(',') if col)
+        offset = max(int_arg('offset', 0), 0)
+        limit = min(max(int_arg('limit', API_PAGE_SIZE), 0), API_MAX_PAGE_SIZE)
+        if api_table(data, endpoint, args, columns) is None:
+            return {'error': 'not found'}, 404
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    ## gzip;q=0 refuses gzip
+    compress = request.accept_encodings['gzip'] > 0
+    etag = hashlib.sha1(f"{data['version']}:{request.full_path}:{fmt}:{compress}".encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(max(mtime for _, mtime in data['sources'].values()) // 10**9, timezone.utc)
+    response = Response(mimetype=API_MIMETYPES[fmt])
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Accept')
+    ## If-None-Match wins over If-Modified-Since, like in RFC 9110
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+    if not_modified:
+        response.status_code = 304
+        return response
+    body, total, gzipped = encode_api_table(data, endpoint, args, columns, offset, limit, fmt, compress)
+    response.set_data(body)
+    response.headers['X-Total-Count'] = str(total)
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# Integer query parameter, ValueError (a 400 of the stats API) when it is missing and required
+def int_arg(name, default=None):
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f'missing parameter {name}')
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'parameter {name} must be an integer') from None
+
+#### MAIN
+
+## Build only the dataset cache, e.g. as a deploy step: python nba-scouting-stats.py --build-cache
+if __name__ == '__main__' and '--build-cache' in sys.argv:
+    load_dataset(rebuild=True)
+    prune_cache(CACHE_DIR, keep={source_fingerprint(DATASET_DIR)})
+    sys.exit(0)
+
+# Read data
+## Cleaned and merged dataset, from the cache or from the source CSVs, with its rollups and indexes.
+## Callbacks read DATA once per call, refresh_dataset swaps in a new one
+SOURCE_STATS = source_stats(DATASET_DIR)
+DATA = build_dashboard_data(*load_dataset(stats=SOURCE_STATS), SOURCE_STATS, source_checkpoints(DATASET_DIR, SOURCE_STATS))
+## The version this process serves is the one the refreshing processes start from.
+## Versions of earlier runs are removed, only refresh_dataset keeps the previous one for the other workers
+publish_dataset(DATA)
+prune_cache(CACHE_DIR, keep={DATA['version']})
+REFRESH_LOCK = threading.Lock()
+
+# Figure cache
+## Callback outputs only depend on their inputs and on the dataset version
+FIGURE_CACHE = make_figure_cache()
 
 # Data Visualization
 ### Graph 1 --> For specific season, evaluate top players for pts, reb, assist and fg3
@@ -58,182 +1429,289 @@ games_full_df.rename(columns={'NICKNAME': 'TEAM'}, inplace=True)
 app = Dash(__name__, external_stylesheets=EXTERNAL_STYLESHEET)
 app.title = 'NBA Scounting Stats'
 
+## Instrument every callback and expose the histograms, only with NBA_METRICS=1
+if METRICS_ENABLED:
+    app.callback = instrument_app_callbacks(app.callback)
+
+    @app.server.route('/metrics')
+    def metrics():
+        snapshots = read_metrics_snapshots()
+        text = render_metrics(snapshots)
+        if FIGURE_CACHE is not None:
+            counters = figure_cache_counters(snapshots)
+            for counter in ('hits', 'misses'):
+                text += f'# HELP nba_figure_cache_{counter}_total Figure cache {counter}\n# TYPE nba_figure_cache_{counter}_total counter\n'
+                text += f'nba_figure_cache_{counter}_total{{backend="{FIGURE_CACHE_BACKEND}"}} {counters[counter]}\n'
+        return Response(text, mimetype='text/plain; version=0.0.4')
+
+## Refresh on demand, e.g. curl -X POST -H 'X-Refresh-Token: ...' -H 'Content-Type: application/json' -d '{"delta_dir": "..."}'.
+## The process serving the request refreshes and publishes the new cache version, the other workers map it at their next watcher check
+if REFRESH_TOKEN:
+    @app.server.route('/admin/refresh', methods=['POST'])
+    def admin_refresh():
+        if request.headers.get('X-Refresh-Token') != REFRESH_TOKEN:
+            return {'error': 'invalid token'}, 403
+        delta_dir = (request.get_json(silent=True) or {}).get('delta_dir')
+        return {'refresh': refresh_dataset(delta_dir=delta_dir), 'version': DATA['version']}
+
+## Stats API: the aggregates behind the tables and figures, as JSON or Arrow.
+## Every endpoint takes columns=A,B, offset, limit and format=json|arrow, e.g. /api/players/LeBron%20James/games?season=2010&columns=GAME_DATE_EST,PTS
+@app.server.route('/api/leaders/<agg>')
+def api_leaders_route(agg):
+    try:
+        args = (agg, int_arg('season'), int_arg('top_k', LEADERBOARD_SIZE))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return api_response('leaders', *args)
+
+@app.server.route('/api/teams/seasons')
+def api_team_seasons_route():
+    return api_response('team_seasons', request.args.get('agg', 'sum'), request.args.get('team'))
+
+@app.server.route('/api/teams/<team>/players')
+def api_team_players_route(team):
+    try:
+        args = (request.args.get('agg', 'sum'), team, int_arg('season'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return api_response('team_players', *args)
+
+@app.server.route('/api/players/<player>/seasons')
+def api_player_seasons_route(player):
+    return api_response('player_seasons', request.args.get('agg', 'sum'), player)
+
+@app.server.route('/api/players/<player>/games')
+def api_player_games_route(player):
+    try:
+        args = (player, int_arg('season'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return api_response('player_games', *args)
+
+## Hit and miss counters of the figure cache, summed over the worker processes with NBA_METRICS_DIR
+@app.server.route('/figure-cache')
+def figure_cache_stats():
+    if FIGURE_CACHE is None:
+        return {'backend': 'none'}
+    snapshots = read_metrics_snapshots()
+    return {**FIGURE_CACHE.stats(), **figure_cache_counters(snapshots), 'processes': len(snapshots)}
+
+## Record the counters of this process after every request, for the processes that answer the next scrapes
+if METRICS_DIR:
+    @app.server.teardown_request
+    def flush_metrics(exc):
+        write_metrics_snapshot()
+
+    os.register_at_fork(after_in_child=reset_forked_metrics)
+    ## The load phases of this process, e.g. of the master that loads the data before forking the workers
+    write_metrics_snapshot()
+
 # Layout of the app
 # html.Div(children='NBA Scounting Stats', className='title')
-app.layout = html.Div([
-    html.H1(children='NBA Scouting Stats', style={'textAlign':'left'}),
-    ### Graphs 1
-    html.H2(children='Top Players for a specific season', className="paragraphTitle"),
-    dcc.Dropdown(np.sort(games_full_df['SEASON'].unique()), '2003', id='season-dropdown'),
-    html.Div([ html.P(children='Total Statistics', className='tableLabel'),
-                dash_table.DataTable([], GENERAL_STATS_COLUMNS, id='stats-sum-table',style_table={'border': 'thin lightgrey solid'},
-                                                                style_header={'backgroundColor':'lightgrey','fontWeight':'bold'},
-                                                                style_cell={'textAlign':'center','width':'12%'})
-    ],  className='primary2DivSplit'),
-    html.Div([ html.P(children='Average Statistics', className='tableLabel'),
-                dash_table.DataTable([], GENERAL_STATS_COLUMNS, id='stats-avg-table',style_table={'border': 'thin lightgrey solid'},
-                                                                style_header={'backgroundColor':'lightgrey','fontWeight':'bold'},
-                                                                style_cell={'textAlign':'center','width':'12%'})
-    ],  className='secondary2DivSplit'),
-    ### Graphs 2
-    html.H2(children='Team statistics for a specific season', className="paragraphTitle"),
-    html.P(children='Team Dropdown', className='tableLabel'),
-    dcc.Dropdown(np.sort(games_full_df['TEAM'].unique()), 'All', id='team-dropdown'),
-    html.P(children='Total Statistics', className='tableLabel'),
-    html.Div([ dcc.Graph(id='pts-team-season-sum')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='reb-team-season-sum')],  
-                className='secondary2DivSplit'),
-    html.Div([ dcc.Graph(id='ast-team-season-sum')],  
-                className='primary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3m-team-season-sum')],  
-                className='secondary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3a-team-season-sum')],  
-                className='secondary3DivSplit'),
-    html.P(children='Average Statistics', className='tableLabel'),
-    html.Div([ dcc.Graph(id='pts-team-season-avg')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='reb-team-season-avg')],  
-                className='secondary2DivSplit'),
-    html.Div([ dcc.Graph(id='ast-team-season-avg')],  
-                className='primary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3m-team-season-avg')],  
-                className='secondary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3a-team-season-avg')],  
-                className='secondary3DivSplit'),
-    ### Graphs 3
-    html.H2(children='Team statistics divided by players for a specific season', className="paragraphTitle"),
-    html.Div([ html.P(children='Season Dropdown', className='tableLabel'),
-                dcc.Dropdown(np.sort(games_full_df['SEASON'].unique()), '2003', id='season-dropdown-pie')],  
-                className='primary2DivSplit'),
-    html.Div([ html.P(children='Team Dropdown', className='tableLabel'),
-                dcc.Dropdown(np.sort(games_full_df['TEAM'].unique()), 'Bulls', id='team-dropdown-pie')],  
-            className='secondary2DivSplit'), 
-    html.Div([ dcc.Graph(id='pts-team-player-pie')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='reb-team-player-pie')],  
-                className='secondary2DivSplit'),
-    html.Div([ dcc.Graph(id='ast-team-player-pie')],  
-                className='primary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3m-team-player-pie')],  
-                className='secondary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3a-team-player-pie')],  
-                className='secondary3DivSplit'), 
-    ### Graphs 4
-    html.H2(children='Player statistics across all seasons', className="paragraphTitle"),
-    html.P(children='Player Dropdown', className='tableLabel'),
-    dcc.Dropdown(np.sort(games_full_df['PLAYER_NAME'].unique()), 'Tyson Chandler', id='player-dropdown'),
-    html.P(children='Total Statistics', className='tableLabel'),
-    html.Div([ dcc.Graph(id='pts-player-sum')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='reb-player-sum')],  
-                className='secondary2DivSplit'),
-    html.Div([ dcc.Graph(id='ast-player-sum')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='fg3-player-sum')],  
-                className='secondary2DivSplit'),
-    html.P(children='Average Statistics', className='tableLabel'),
-    html.Div([ dcc.Graph(id='pts-player-avg')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='reb-player-avg')],  
-                className='secondary2DivSplit'),
-    html.Div([ dcc.Graph(id='ast-player-avg')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='fg3-player-avg')],  
-                className='secondary2DivSplit'),
-    ### Graphs 5
-    html.H2(children='Player statistics across all matches of a specific season', className="paragraphTitle"),
-    html.Div([ html.P(children='Season Dropdown', className='tableLabel'),
-                dcc.Dropdown(np.sort(games_full_df['SEASON'].unique()), '2003', id='season-dropdown-match')],  
-                className='primary2DivSplit'),
-    html.Div([ html.P(children='Player Dropdown', className='tableLabel'),
-                    dcc.Dropdown(np.sort(games_full_df['PLAYER_NAME'].unique()), 'Tyson Chandler', id='player-dropdown-match')],  
-            className='secondary2DivSplit'), 
-    html.Div([ dcc.Graph(id='shot-player')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='fg3-player')],  
-                className='secondary2DivSplit'),
-    ### Graph 6
-    html.H2(children='Players Comparison across all seasons', className="paragraphTitle"),
-    html.Div([ html.P(children='Player 1 Dropdown', className='tableLabel'),
-                dcc.Dropdown(np.sort(games_full_df['PLAYER_NAME'].unique()), 'Kobe Bryant', id='player1-dropdown')],  
-                className='primary2DivSplit'),
-    html.Div([ html.P(children='Player 2 Dropdown', className='tableLabel'),
-                    dcc.Dropdown(np.sort(games_full_df['PLAYER_NAME'].unique()), 'LeBron James', id='player2-dropdown')],
+## Built on every page load, so that the dropdowns follow the refreshed data
+def serve_layout():
+    dropdown_values = DATA['dropdowns']
+    trends = DATA['trends']
+    first_day, last_day = trends['days']
+    return html.Div([
+        html.H1(children='NBA Scouting Stats', style={'textAlign':'left'}),
+        ### Graphs 1
+        html.H2(children='Top Players for a specific season', className="paragraphTitle"),
+        dcc.Dropdown(dropdown_values['SEASON'], '2003', id='season-dropdown'),
+        html.P(children='Players per Stat', className='tableLabel'),
+        dcc.Dropdown(LEADERBOARD_SIZE_OPTIONS, 1, id='leaderboard-size-dropdown', clearable=False),
+        html.Div([ html.P(children='Total Statistics', className='tableLabel'),
+                    dash_table.DataTable([], GENERAL_STATS_COLUMNS, id='stats-sum-table',style_table={'border': 'thin lightgrey solid'},
+                                                                    style_header={'backgroundColor':'lightgrey','fontWeight':'bold'},
+                                                                    style_cell={'textAlign':'center','width':'12%'})
+        ],  className='primary2DivSplit'),
+        html.Div([ html.P(children='Average Statistics', className='tableLabel'),
+                    dash_table.DataTable([], GENERAL_STATS_COLUMNS, id='stats-avg-table',style_table={'border': 'thin lightgrey solid'},
+                                                                    style_header={'backgroundColor':'lightgrey','fontWeight':'bold'},
+                                                                    style_cell={'textAlign':'center','width':'12%'})
+        ],  className='secondary2DivSplit'),
+        ### Graphs 2
+        html.H2(children='Team statistics for a specific season', className="paragraphTitle"),
+        html.P(children='Team Dropdown', className='tableLabel'),
+        dcc.Dropdown(dropdown_values['TEAM'], 'All', id='team-dropdown'),
+        html.P(children='Total Statistics', className='tableLabel'),
+        html.Div([ dcc.Graph(id='pts-team-season-sum')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='reb-team-season-sum')],  
+                    className='secondary2DivSplit'),
+        html.Div([ dcc.Graph(id='ast-team-season-sum')],  
+                    className='primary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3m-team-season-sum')],  
+                    className='secondary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3a-team-season-sum')],  
+                    className='secondary3DivSplit'),
+        html.P(children='Average Statistics', className='tableLabel'),
+        html.Div([ dcc.Graph(id='pts-team-season-avg')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='reb-team-season-avg')],  
+                    className='secondary2DivSplit'),
+        html.Div([ dcc.Graph(id='ast-team-season-avg')],  
+                    className='primary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3m-team-season-avg')],  
+                    className='secondary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3a-team-season-avg')],  
+                    className='secondary3DivSplit'),
+        ### Graphs 3
+        html.H2(children='Team statistics divided by players for a specific season', className="paragraphTitle"),
+        html.Div([ html.P(children='Season Dropdown', className='tableLabel'),
+                    dcc.Dropdown(dropdown_values['SEASON'], '2003', id='season-dropdown-pie')],  
+                    className='primary2DivSplit'),
+        html.Div([ html.P(children='Team Dropdown', className='tableLabel'),
+                    dcc.Dropdown(dropdown_values['TEAM'], 'Bulls', id='team-dropdown-pie')],  
                 className='secondary2DivSplit'), 
-    html.P(children='Total Statistics', className='tableLabel'),
-    html.Div([ dcc.Graph(id='pts-player-sum-comparison')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='reb-player-sum-comparison')],  
-                className='secondary2DivSplit'),
-    html.Div([ dcc.Graph(id='ast-player-sum-comparison')],  
-                className='primary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3m-player-sum-comparison')],  
-                className='secondary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3a-player-sum-comparison')],  
-                className='secondary3DivSplit'),
-    html.P(children='Average Statistics', className='tableLabel'),
-    html.Div([ dcc.Graph(id='pts-player-avg-comparison')],  
-                className='primary2DivSplit'),
-    html.Div([ dcc.Graph(id='reb-player-avg-comparison')],  
-                className='secondary2DivSplit'),
-    html.Div([ dcc.Graph(id='ast-player-avg-comparison')],  
-                className='primary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3m-player-avg-comparison')],  
-                className='secondary3DivSplit'),
-    html.Div([ dcc.Graph(id='fg3a-player-avg-comparison')],  
-                className='secondary3DivSplit')
-])
+        html.Div([ dcc.Graph(id='pts-team-player-pie')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='reb-team-player-pie')],  
+                    className='secondary2DivSplit'),
+        html.Div([ dcc.Graph(id='ast-team-player-pie')],  
+                    className='primary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3m-team-player-pie')],  
+                    className='secondary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3a-team-player-pie')],  
+                    className='secondary3DivSplit'), 
+        ### Graphs 4
+        html.H2(children='Player statistics across all seasons', className="paragraphTitle"),
+        html.P(children='Player Dropdown', className='tableLabel'),
+        dcc.Dropdown(['Tyson Chandler'], 'Tyson Chandler', id='player-dropdown'),
+        html.P(children='Total Statistics', className='tableLabel'),
+        html.Div([ dcc.Graph(id='pts-player-sum')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='reb-player-sum')],  
+                    className='secondary2DivSplit'),
+        html.Div([ dcc.Graph(id='ast-player-sum')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='fg3-player-sum')],  
+                    className='secondary2DivSplit'),
+        html.P(children='Average Statistics', className='tableLabel'),
+        html.Div([ dcc.Graph(id='pts-player-avg')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='reb-player-avg')],  
+                    className='secondary2DivSplit'),
+        html.Div([ dcc.Graph(id='ast-player-avg')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='fg3-player-avg')],  
+                    className='secondary2DivSplit'),
+        ### Graphs 5
+        html.H2(children='Player statistics across all matches of a specific season', className="paragraphTitle"),
+        html.Div([ html.P(children='Season Dropdown', className='tableLabel'),
+                    dcc.Dropdown(dropdown_values['SEASON'], '2003', id='season-dropdown-match')],  
+                    className='primary2DivSplit'),
+        html.Div([ html.P(children='Player Dropdown', className='tableLabel'),
+                        dcc.Dropdown(['Tyson Chandler'], 'Tyson Chandler', id='player-dropdown-match')],  
+                className='secondary2DivSplit'), 
+        html.Div([ dcc.Graph(id='shot-player')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='fg3-player')],  
+                    className='secondary2DivSplit'),
+        ### Graph 6
+        html.H2(children='Players Comparison across all seasons', className="paragraphTitle"),
+        html.P(children=f'Players Dropdown (up to {PLAYER_COMPARISON_LIMIT})', className='tableLabel'),
+        dcc.Dropdown(['Kobe Bryant', 'LeBron James'], ['Kobe Bryant', 'LeBron James'], id='players-dropdown-comparison', multi=True),
+        html.P(children='Total Statistics', className='tableLabel'),
+        html.Div([ dcc.Graph(id='pts-player-sum-comparison')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='reb-player-sum-comparison')],  
+                    className='secondary2DivSplit'),
+        html.Div([ dcc.Graph(id='ast-player-sum-comparison')],  
+                    className='primary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3m-player-sum-comparison')],  
+                    className='secondary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3a-player-sum-comparison')],  
+                    className='secondary3DivSplit'),
+        html.P(children='Average Statistics', className='tableLabel'),
+        html.Div([ dcc.Graph(id='pts-player-avg-comparison')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='reb-player-avg-comparison')],  
+                    className='secondary2DivSplit'),
+        html.Div([ dcc.Graph(id='ast-player-avg-comparison')],  
+                    className='primary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3m-player-avg-comparison')],  
+                    className='secondary3DivSplit'),
+        html.Div([ dcc.Graph(id='fg3a-player-avg-comparison')],  
+                    className='secondary3DivSplit'),
+        ### Graph 7
+        html.H2(children='Player and team trends across a time period', className="paragraphTitle"),
+        html.Div([ html.P(children='Player Dropdown', className='tableLabel'),
+                    dcc.Dropdown(['Tyson Chandler'], 'Tyson Chandler', id='player-dropdown-trend')],  
+                    className='primary2DivSplit'),
+        html.Div([ html.P(children='Team Dropdown', className='tableLabel'),
+                    dcc.Dropdown(dropdown_values['TEAM'], 'Bulls', id='team-dropdown-trend')],  
+                    className='secondary2DivSplit'),
+        html.P(children='Time Period', className='tableLabel'),
+        ## Days since 1970-01-01, one mark at the start of every season; the callbacks follow the slider while it is dragged
+        dcc.RangeSlider(first_day, last_day, 1, value=[first_day, last_day], id='date-range-slider', updatemode='drag',
+                        marks={int(day): str(season) for season, day in trends['seasons'].items()}),
+        html.P(children='Rolling Window (games)', className='tableLabel'),
+        dcc.Dropdown(TREND_WINDOW_OPTIONS, TREND_WINDOW, id='trend-window-dropdown', clearable=False),
+        html.Div([ html.P(id='trend-period', className='tableLabel'),
+                    dash_table.DataTable([], TREND_COLUMNS, id='trend-table',style_table={'border': 'thin lightgrey solid'},
+                                                                    style_header={'backgroundColor':'lightgrey','fontWeight':'bold'},
+                                                                    style_cell={'textAlign':'center','width':'12%'})
+        ]),
+        html.Div([ dcc.Graph(id='player-trend')],  
+                    className='primary2DivSplit'),
+        html.Div([ dcc.Graph(id='team-trend')],  
+                    className='secondary2DivSplit'),
+        ### Graph 8
+        html.H2(children='Similar player seasons', className="paragraphTitle"),
+        html.Div([ html.P(children='Player Dropdown', className='tableLabel'),
+                    dcc.Dropdown(['Tyson Chandler'], 'Tyson Chandler', id='player-dropdown-similar')],  
+                    className='primary2DivSplit'),
+        html.Div([ html.P(children='Season Dropdown', className='tableLabel'),
+                    dcc.Dropdown(dropdown_values['SEASON'], '2003', id='season-dropdown-similar')],  
+                    className='secondary2DivSplit'),
+        html.P(children='Similar Seasons', className='tableLabel'),
+        dcc.Dropdown(SIMILAR_SIZE_OPTIONS, SIMILAR_SIZE, id='similar-size-dropdown', clearable=False),
+        html.Div([ html.P(id='similar-selected', className='tableLabel'),
+                    dash_table.DataTable([], SIMILAR_COLUMNS, id='similar-table',style_table={'border': 'thin lightgrey solid'},
+                                                                    style_header={'backgroundColor':'lightgrey','fontWeight':'bold'},
+                                                                    style_cell={'textAlign':'center'})
+        ])
+    ])
+
+app.layout = serve_layout
+
+### Callbacks for the player dropdowns search
+def update_player_options(search_value, value):
+    if not search_value:
+        raise PreventUpdate
+    options = search_names(DATA['name_index'], search_value)
+    ## Keep the selected players, otherwise the dropdown would lose them
+    selected = value if isinstance(value, list) else [value] if value else []
+    options[:0] = [player for player in selected if player not in options]
+    return options
+
+for dropdown_id in PLAYER_DROPDOWNS:
+    app.callback(
+        Output(dropdown_id, 'options'),
+        Input(dropdown_id, 'search_value'),
+        State(dropdown_id, 'value')
+    )(update_player_options)
 
 ### Callback for stats-sum-table
 @app.callback(
     Output('stats-sum-table', 'data'),
-    Input('season-dropdown', 'value')
+    Input('season-dropdown', 'value'),
+    Input('leaderboard-size-dropdown', 'value')
 )
-def update_table(season):
-    stats_col = ['PTS','REB', 'AST', 'FG3M', 'FG3A']
-    performances_by_season_sum = games_full_df.groupby(['SEASON', 'TEAM','PLAYER_NAME'])[['PTS','REB', 'AST', 'FG3M', 'FG3A']].sum().reset_index()
-    #print(type(season))
-    season_data_df = performances_by_season_sum[performances_by_season_sum['SEASON'] == int(season)]
-    #print(season_data_df)
-    table_data = []
-    for col in stats_col:
-        #print(col)
-        best_player = season_data_df[season_data_df[col] == season_data_df[col].max()]
-        #print(best_player)
-        table_data.append({
-            '0': col,
-            '1': best_player['PLAYER_NAME'].values[0],
-            '2': best_player['TEAM'].values[0],
-            '3': season_data_df[col].max()
-        })
-    #print(table_data)
-    return table_data
+@memoize_figures('update_table_sum')
+def update_table(season, top_k):
+    return leaderboard_table(DATA['leaderboards'], 'sum', season, top_k)
 
 ### Callback for stats-avg-table
 @app.callback(
     Output('stats-avg-table', 'data'),
-    Input('season-dropdown', 'value')
+    Input('season-dropdown', 'value'),
+    Input('leaderboard-size-dropdown', 'value')
 )
-def update_table(season):
-    stats_col = ['PTS','REB', 'AST', 'FG3M', 'FG3A']
-    performances_by_season_sum = games_full_df.groupby(['SEASON', 'TEAM','PLAYER_NAME'])[['PTS','REB', 'AST', 'FG3M', 'FG3A']].mean().reset_index().round(decimals=2)
-    #print(type(season))
-    season_data_df = performances_by_season_sum[performances_by_season_sum['SEASON'] == int(season)]
-    #print(season_data_df)
-    table_data = []
-    for col in stats_col:
-        #print(col)
-        best_player = season_data_df[season_data_df[col] == season_data_df[col].max()]
-        #print(best_player)
-        table_data.append({
-            '0': col,
-            '1': best_player['PLAYER_NAME'].values[0],
-            '2': best_player['TEAM'].values[0],
-            '3': season_data_df[col].max()
-        })
-    #print(table_data)
-    return table_data
+@memoize_figures('update_table_avg')
+def update_table(season, top_k):
+    return leaderboard_table(DATA['leaderboards'], 'mean', season, top_k)
 
 ### Callback for Team statistic for a specific season
 @app.callback(
@@ -249,26 +1727,26 @@ def update_table(season):
     Output('fg3a-team-season-avg', 'figure'),
     Input('team-dropdown', 'value')
 )
+@memoize_figures('update_team_graphs')
 def update_graphs(team):
-    performances_by_season_sum = games_full_df.groupby(['SEASON', 'TEAM'])[['PTS','REB', 'AST', 'FG3M', 'FG3A' ]].sum().reset_index()
-    performances_by_season_avg = games_full_df.groupby(['SEASON', 'TEAM', 'GAME_ID'])[['PTS','REB', 'AST', 'FG3M', 'FG3A']].sum().groupby(['SEASON', 'TEAM']).mean().reset_index()
+    rollups = DATA['rollups']
     if team != 'All':
-        plot_sum_data = performances_by_season_sum[performances_by_season_sum['TEAM'] == team]
-        plot_avg_data = performances_by_season_avg[performances_by_season_avg['TEAM'] == team]
+        plot_sum_data = lookup_rollup(rollups, 'season_team', 'sum', TEAM=team)
+        plot_avg_data = lookup_rollup(rollups, 'season_team', 'mean', TEAM=team)
     else: 
-        plot_sum_data = performances_by_season_sum
-        plot_avg_data = performances_by_season_avg
+        plot_sum_data = lookup_rollup(rollups, 'season_team', 'sum')
+        plot_avg_data = lookup_rollup(rollups, 'season_team', 'mean')
     
-    fig1 = px.line(plot_sum_data, x='SEASON', y='PTS', markers=True, color="TEAM", color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total PTS per Season')
-    fig2 = px.line(plot_avg_data, x='SEASON', y='PTS', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average PTS per Season')
-    fig3 = px.line(plot_sum_data, x='SEASON', y='REB', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total REB per Season')
-    fig4 = px.line(plot_avg_data, x='SEASON', y='REB', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average REB per Season')
-    fig5 = px.line(plot_sum_data, x='SEASON', y='AST', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total AST per Season')
-    fig6 = px.line(plot_avg_data, x='SEASON', y='AST', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average AST per Season')
-    fig7 = px.line(plot_sum_data, x='SEASON', y='FG3M', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total FG3M per Season')
-    fig8 = px.line(plot_avg_data, x='SEASON', y='FG3M', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average FG3M per Season')
-    fig9 = px.line(plot_sum_data, x='SEASON', y='FG3A', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total FG3A per Season')
-    fig10 = px.line(plot_avg_data, x='SEASON', y='FG3A', markers=True, color='TEAM', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average FG3A per Season')
+    fig1 = line_figure(plot_sum_data, x='SEASON', y='PTS', colors=px.colors.qualitative.Dark24, title='Total PTS per Season', color='TEAM')
+    fig2 = line_figure(plot_avg_data, x='SEASON', y='PTS', colors=px.colors.qualitative.Dark24, title='Average PTS per Season', color='TEAM')
+    fig3 = line_figure(plot_sum_data, x='SEASON', y='REB', colors=px.colors.qualitative.Dark24, title='Total REB per Season', color='TEAM')
+    fig4 = line_figure(plot_avg_data, x='SEASON', y='REB', colors=px.colors.qualitative.Dark24, title='Average REB per Season', color='TEAM')
+    fig5 = line_figure(plot_sum_data, x='SEASON', y='AST', colors=px.colors.qualitative.Dark24, title='Total AST per Season', color='TEAM')
+    fig6 = line_figure(plot_avg_data, x='SEASON', y='AST', colors=px.colors.qualitative.Dark24, title='Average AST per Season', color='TEAM')
+    fig7 = line_figure(plot_sum_data, x='SEASON', y='FG3M', colors=px.colors.qualitative.Dark24, title='Total FG3M per Season', color='TEAM')
+    fig8 = line_figure(plot_avg_data, x='SEASON', y='FG3M', colors=px.colors.qualitative.Dark24, title='Average FG3M per Season', color='TEAM')
+    fig9 = line_figure(plot_sum_data, x='SEASON', y='FG3A', colors=px.colors.qualitative.Dark24, title='Total FG3A per Season', color='TEAM')
+    fig10 = line_figure(plot_avg_data, x='SEASON', y='FG3A', colors=px.colors.qualitative.Dark24, title='Average FG3A per Season', color='TEAM')
 
     return fig1, fig2, fig3, fig4, fig5, fig6, fig7, fig8, fig9, fig10
 
@@ -282,15 +1760,16 @@ def update_graphs(team):
     Input('team-dropdown-pie', 'value'),
     Input('season-dropdown-pie', 'value')
 )
+@memoize_figures('update_pies')
 def update_pies(team, season):
-    performances_by_season_sum = games_full_df.groupby(['SEASON', 'TEAM', 'PLAYER_NAME'])[['PTS','REB', 'AST', 'FG3M', 'FG3A' ]].sum().reset_index()
-    plot_sum_data = performances_by_season_sum[(performances_by_season_sum['TEAM'] == team) & (performances_by_season_sum['SEASON'] == int(season))]
+    rollups = DATA['rollups']
+    plot_sum_data = lookup_rollup(rollups, 'season_team_player', 'sum', SEASON=int(season), TEAM=team)
     #print(plot_sum_data)
-    fig1 = px.pie(plot_sum_data, values=plot_sum_data['PTS'], names=plot_sum_data['PLAYER_NAME'], color_discrete_sequence=px.colors.qualitative.Light24, title =f'PTS division for {team} team in season {season}', hole=.3)
-    fig2 = px.pie(plot_sum_data, values=plot_sum_data['REB'], names=plot_sum_data['PLAYER_NAME'], color_discrete_sequence=px.colors.qualitative.Light24, title =f'REB division for {team} team in season {season}', hole=.3)
-    fig3 = px.pie(plot_sum_data, values=plot_sum_data['AST'], names=plot_sum_data['PLAYER_NAME'], color_discrete_sequence=px.colors.qualitative.Light24, title =f'AST division for {team} team in season {season}', hole=.3)
-    fig4 = px.pie(plot_sum_data, values=plot_sum_data['FG3M'], names=plot_sum_data['PLAYER_NAME'], color_discrete_sequence=px.colors.qualitative.Light24, title =f'FG3M division for {team} team in season {season}', hole=.3)
-    fig5 = px.pie(plot_sum_data, values=plot_sum_data['FG3A'], names=plot_sum_data['PLAYER_NAME'], color_discrete_sequence=px.colors.qualitative.Light24, title =f'FG3A division for {team} team in season {season}', hole=.3)
+    fig1 = pie_figure(plot_sum_data, values='PTS', names='PLAYER_NAME', colors=px.colors.qualitative.Light24, title=f'PTS division for {team} team in season {season}', hole=.3)
+    fig2 = pie_figure(plot_sum_data, values='REB', names='PLAYER_NAME', colors=px.colors.qualitative.Light24, title=f'REB division for {team} team in season {season}', hole=.3)
+    fig3 = pie_figure(plot_sum_data, values='AST', names='PLAYER_NAME', colors=px.colors.qualitative.Light24, title=f'AST division for {team} team in season {season}', hole=.3)
+    fig4 = pie_figure(plot_sum_data, values='FG3M', names='PLAYER_NAME', colors=px.colors.qualitative.Light24, title=f'FG3M division for {team} team in season {season}', hole=.3)
+    fig5 = pie_figure(plot_sum_data, values='FG3A', names='PLAYER_NAME', colors=px.colors.qualitative.Light24, title=f'FG3A division for {team} team in season {season}', hole=.3)
 
     return fig1, fig2, fig3, fig4, fig5
 
@@ -306,20 +1785,20 @@ def update_pies(team, season):
     Output('fg3-player-avg', 'figure'),
     Input('player-dropdown', 'value')
 )
+@memoize_figures('update_player_graphs')
 def update_graphs(player):
-    performances_by_season_sum = games_full_df.groupby(['SEASON', 'TEAM', 'PLAYER_NAME'])[['PTS','REB', 'AST', 'FG3M', 'FG3A']].sum().reset_index()
-    performances_by_season_avg = games_full_df.groupby(['SEASON', 'TEAM', 'PLAYER_NAME'])[['PTS','REB', 'AST', 'FG3M', 'FG3A']].mean().reset_index()
-    plot_sum_data = performances_by_season_sum[performances_by_season_sum['PLAYER_NAME'] == player]
-    plot_avg_data = performances_by_season_avg[performances_by_season_avg['PLAYER_NAME'] == player]
-
-    fig1 = px.line(plot_sum_data, x='SEASON', y='PTS', markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Total PTS per Season for player {player}')
-    fig2 = px.line(plot_sum_data, x='SEASON', y='REB', markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Total REB per Season for player {player}')
-    fig3 = px.line(plot_sum_data, x='SEASON', y='AST', markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Total AST per Season for player {player}')
-    fig4 = px.line(plot_sum_data, x='SEASON', y=['FG3M', 'FG3A'], markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Total Three Points Stats per Season per player {player}')
-    fig5 = px.line(plot_avg_data, x='SEASON', y='PTS', markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Average PTS per Season for player {player}')
-    fig6 = px.line(plot_avg_data, x='SEASON', y='REB', markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Average REB per Season for player {player}')
-    fig7 = px.line(plot_avg_data, x='SEASON', y='AST', markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Average AST per Season for player {player}')
-    fig8 = px.line(plot_avg_data, x='SEASON', y=['FG3M', 'FG3A'], markers=True, color_discrete_sequence=px.colors.qualitative.T10, title = f'Average Three Points Stats per Season per player {player}')
+    rollups = DATA['rollups']
+    plot_sum_data = lookup_rollup(rollups, 'season_team_player', 'sum', PLAYER_NAME=player)
+    plot_avg_data = lookup_rollup(rollups, 'season_team_player', 'mean', PLAYER_NAME=player)
+
+    fig1 = line_figure(plot_sum_data, x='SEASON', y='PTS', colors=px.colors.qualitative.T10, title=f'Total PTS per Season for player {player}')
+    fig2 = line_figure(plot_sum_data, x='SEASON', y='REB', colors=px.colors.qualitative.T10, title=f'Total REB per Season for player {player}')
+    fig3 = line_figure(plot_sum_data, x='SEASON', y='AST', colors=px.colors.qualitative.T10, title=f'Total AST per Season for player {player}')
+    fig4 = line_figure(plot_sum_data, x='SEASON', y=['FG3M', 'FG3A'], colors=px.colors.qualitative.T10, title=f'Total Three Points Stats per Season per player {player}')
+    fig5 = line_figure(plot_avg_data, x='SEASON', y='PTS', colors=px.colors.qualitative.T10, title=f'Average PTS per Season for player {player}')
+    fig6 = line_figure(plot_avg_data, x='SEASON', y='REB', colors=px.colors.qualitative.T10, title=f'Average REB per Season for player {player}')
+    fig7 = line_figure(plot_avg_data, x='SEASON', y='AST', colors=px.colors.qualitative.T10, title=f'Average AST per Season for player {player}')
+    fig8 = line_figure(plot_avg_data, x='SEASON', y=['FG3M', 'FG3A'], colors=px.colors.qualitative.T10, title=f'Average Three Points Stats per Season per player {player}')
 
     return fig1, fig2, fig3, fig4, fig5, fig6, fig7, fig8
 
@@ -330,16 +1809,22 @@ def update_graphs(player):
     Input('player-dropdown-match', 'value'),
     Input('season-dropdown-match', 'value')
 )
+@memoize_figures('update_players')
 def update_players(player, season):
-    plot_data = games_full_df[(games_full_df['PLAYER_NAME'] == player) & (games_full_df['SEASON'] == int(season))]
-    plot_data['GAME_NUMBER'] = range(len(plot_data))
+    data = DATA
+    plot_data = player_season_games(data['games'], data['player_index'], player, season)
 
-    fig1 = px.line(plot_data, x='GAME_NUMBER', y=['PTS', 'REB', 'AST'], markers=True, color_discrete_sequence=px.colors.qualitative.Dark24, title = f'PTS, REB and AST per match per season {season} for player {player}')
-    fig2 = px.line(plot_data, x='GAME_NUMBER', y=['FG3A', 'FG3M'], markers=True, color_discrete_sequence=px.colors.qualitative.Dark24, title = f'FG3M, FG3A per match per season {season} for player {player}')
+    fig1 = line_figure(plot_data, x='GAME_NUMBER', y=['PTS', 'REB', 'AST'], colors=px.colors.qualitative.Dark24, title=f'PTS, REB and AST per match per season {season} for player {player}')
+    fig2 = line_figure(plot_data, x='GAME_NUMBER', y=['FG3A', 'FG3M'], colors=px.colors.qualitative.Dark24, title=f'FG3M, FG3A per match per season {season} for player {player}')
 
     return fig1, fig2
 
 ### Callback for Player Comparison
+## Players actually compared: known players only, without duplicates, the first PLAYER_COMPARISON_LIMIT in the order
+## they were picked. The figures are memoized on this list, not on the raw selection
+def comparison_players(data, players):
+    return [player for player in dict.fromkeys(players or []) if player in data['player_index']['players']][:PLAYER_COMPARISON_LIMIT]
+
 @app.callback(
     Output('pts-player-sum-comparison', 'figure'),
     Output('pts-player-avg-comparison', 'figure'),
@@ -351,25 +1836,26 @@ def update_players(player, season):
     Output('fg3m-player-avg-comparison', 'figure'),
     Output('fg3a-player-sum-comparison', 'figure'),
     Output('fg3a-player-avg-comparison', 'figure'),
-    Input('player1-dropdown', 'value'),
-    Input('player2-dropdown', 'value'),
+    Input('players-dropdown-comparison', 'value'),
 )
-def update_player_comparison(player1, player2):
-    if player1 and player2 and player1 != player2:
-        performances_by_season_sum = games_full_df.groupby(['SEASON', 'PLAYER_NAME'])[['PTS','REB', 'AST', 'FG3M', 'FG3A']].sum().reset_index()
-        performances_by_season_avg = games_full_df.groupby(['SEASON', 'PLAYER_NAME'])[['PTS','REB', 'AST', 'FG3M', 'FG3A']].mean().reset_index().round(decimals=2)
-        plot_sum_data = performances_by_season_sum[(performances_by_season_sum['PLAYER_NAME'] == player1) | (performances_by_season_sum['PLAYER_NAME'] == player2) ]
-        plot_avg_data = performances_by_season_avg[(performances_by_season_avg['PLAYER_NAME'] == player1) | (performances_by_season_avg['PLAYER_NAME'] == player2)]
-        fig1 = px.line(plot_sum_data, x='SEASON', y='PTS', markers=True, color="PLAYER_NAME", color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total PTS per Season')
-        fig2 = px.line(plot_avg_data, x='SEASON', y='PTS', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average PTS per Season')
-        fig3 = px.line(plot_sum_data, x='SEASON', y='REB', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total REB per Season')
-        fig4 = px.line(plot_avg_data, x='SEASON', y='REB', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average REB per Season')
-        fig5 = px.line(plot_sum_data, x='SEASON', y='AST', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total AST per Season')
-        fig6 = px.line(plot_avg_data, x='SEASON', y='AST', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average AST per Season')
-        fig7 = px.line(plot_sum_data, x='SEASON', y='FG3M', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total FG3M per Season')
-        fig8 = px.line(plot_avg_data, x='SEASON', y='FG3M', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average FG3M per Season')
-        fig9 = px.line(plot_sum_data, x='SEASON', y='FG3A', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Total FG3A per Season')
-        fig10 = px.line(plot_avg_data, x='SEASON', y='FG3A', markers=True, color='PLAYER_NAME', color_discrete_sequence=px.colors.qualitative.Dark24, title = 'Average FG3A per Season')
+@memoize_figures('update_player_comparison', normalize=lambda players: tuple(sorted(comparison_players(DATA, players))))
+def update_player_comparison(players):
+    data = DATA
+    rollups = data['rollups']
+    players = comparison_players(data, players)
+    if len(players) >= 2:
+        plot_sum_data = pd.concat([lookup_rollup(rollups, 'season_player', 'sum', PLAYER_NAME=player) for player in players])
+        plot_avg_data = pd.concat([lookup_rollup(rollups, 'season_player', 'mean', PLAYER_NAME=player) for player in players]).round(decimals=2)
+        fig1 = line_figure(plot_sum_data, x='SEASON', y='PTS', colors=px.colors.qualitative.Dark24, title='Total PTS per Season', color='PLAYER_NAME')
+        fig2 = line_figure(plot_avg_data, x='SEASON', y='PTS', colors=px.colors.qualitative.Dark24, title='Average PTS per Season', color='PLAYER_NAME')
+        fig3 = line_figure(plot_sum_data, x='SEASON', y='REB', colors=px.colors.qualitative.Dark24, title='Total REB per Season', color='PLAYER_NAME')
+        fig4 = line_figure(plot_avg_data, x='SEASON', y='REB', colors=px.colors.qualitative.Dark24, title='Average REB per Season', color='PLAYER_NAME')
+        fig5 = line_figure(plot_sum_data, x='SEASON', y='AST', colors=px.colors.qualitative.Dark24, title='Total AST per Season', color='PLAYER_NAME')
+        fig6 = line_figure(plot_avg_data, x='SEASON', y='AST', colors=px.colors.qualitative.Dark24, title='Average AST per Season', color='PLAYER_NAME')
+        fig7 = line_figure(plot_sum_data, x='SEASON', y='FG3M', colors=px.colors.qualitative.Dark24, title='Total FG3M per Season', color='PLAYER_NAME')
+        fig8 = line_figure(plot_avg_data, x='SEASON', y='FG3M', colors=px.colors.qualitative.Dark24, title='Average FG3M per Season', color='PLAYER_NAME')
+        fig9 = line_figure(plot_sum_data, x='SEASON', y='FG3A', colors=px.colors.qualitative.Dark24, title='Total FG3A per Season', color='PLAYER_NAME')
+        fig10 = line_figure(plot_avg_data, x='SEASON', y='FG3A', colors=px.colors.qualitative.Dark24, title='Average FG3A per Season', color='PLAYER_NAME')
 
         return fig1, fig2, fig3, fig4, fig5, fig6, fig7, fig8, fig9, fig10
     else:
@@ -394,6 +1880,68 @@ def update_player_comparison(player1, player2):
         }}
         return empty_message, empty_message, empty_message, empty_message, empty_message, empty_message, empty_message, empty_message, empty_message, empty_message
 
+### Callback for Player and Team trends across a time period
+@app.callback(
+    Output('trend-period', 'children'),
+    Output('trend-table', 'data'),
+    Output('player-trend', 'figure'),
+    Output('team-trend', 'figure'),
+    Input('player-dropdown-trend', 'value'),
+    Input('team-dropdown-trend', 'value'),
+    Input('date-range-slider', 'value'),
+    Input('trend-window-dropdown', 'value')
+)
+## Not memoized: the slider sends a new range at every drag step, each would take a cache entry,
+## while the cumulative sums answer any range in constant time
+def update_trends(player, team, days, window):
+    trends = DATA['trends']
+    start_day, end_day = days or trends['days']
+    period = f"From {np.datetime64(int(start_day), 'D')} to {np.datetime64(int(end_day), 'D')}"
+    player_totals = range_aggregates(trends['players'], player, start_day, end_day)
+    team_totals = range_aggregates(trends['teams'], team, start_day, end_day)
+    table = pd.DataFrame({
+        'STAT': STATS_COLUMNS,
+        'PLAYER_SUM': player_totals['SUM'].to_numpy(),
+        'PLAYER_MEAN': player_totals['MEAN'].round(decimals=2).to_numpy(),
+        'TEAM_SUM': team_totals['SUM'].to_numpy(),
+        'TEAM_MEAN': team_totals['MEAN'].round(decimals=2).to_numpy(),
+    })
+    player_data = rolling_averages(trends['players'], player, start_day, end_day, window)
+    team_data = rolling_averages(trends['teams'], team, start_day, end_day, window)
+
+    fig1 = line_figure(player_data, x='GAME_DATE_EST', y=['PTS', 'REB', 'AST'], colors=px.colors.qualitative.Dark24, title=f'PTS, REB and AST averaged over the last {window} games for player {player}')
+    fig2 = line_figure(team_data, x='GAME_DATE_EST', y=['PTS', 'REB', 'AST'], colors=px.colors.qualitative.Dark24, title=f'PTS, REB and AST averaged over the last {window} games for {team} team')
+
+    return f'{period}: {int(player_totals["COUNT"].max())} games for {player}, {int(team_totals["COUNT"].max())} for {team} team', table.to_dict('records'), fig1, fig2
+
+### Callback for the seasons of the player in Similar player seasons
+@app.callback(
+    Output('season-dropdown-similar', 'options'),
+    Input('player-dropdown-similar', 'value')
+)
+def update_similar_season_options(player):
+    return [str(season) for season in DATA['player_index']['players'].get(player, [])]
+
+### Callback for Similar player seasons
+@app.callback(
+    Output('similar-selected', 'children'),
+    Output('similar-table', 'data'),
+    Input('player-dropdown-similar', 'value'),
+    Input('season-dropdown-similar', 'value'),
+    Input('similar-size-dropdown', 'value')
+)
+@memoize_figures('update_similar_seasons')
+def update_similar_seasons(player, season, k):
+    similarity = DATA['similarity']
+    row = similarity['rows'].get((player, int(season))) if season else None
+    if row is None:
+        return f'No games for {player} in season {season}', []
+    selected = similarity['seasons'].iloc[row]
+    description = ', '.join(f'{selected[col]:.1f} {col}' for col in ['PTS', 'REB', 'AST', 'MIN'])
+    return f'Seasons closest to {player} in {season} ({selected["GAMES"]} games, {description} per game)', similar_seasons_table(similarity, player, season, k)
+
 # Run the app
+## Development server. In production serve app.server with a multi-worker WSGI server, see wsgi.py and gunicorn.conf.py
 if __name__ == '__main__':
+    start_refresh_watcher()
     app.run(debug=True)
@@ -0,0 +1,157 @@
+#### Tests of the incremental dataset refresh
+## Usage: python -m pytest -q tests
+import os
+import sys
+import importlib.util
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import synthetic_data
+
+## First season in the initial sources, the second one is appended
+SEASONS = [2003, 2004]
+ORPHAN_GAME_ID = '99999999'
+
+# Synthetic sources of two seasons, as text so that the rows are written back unchanged
+@pytest.fixture(scope='module')
+def sources(tmp_path_factory):
+    output_dir = tmp_path_factory.mktemp('synthetic')
+    seasons, synthetic_data.SEASONS = synthetic_data.SEASONS, SEASONS
+    try:
+        synthetic_data.generate_dataset(str(output_dir))
+    finally:
+        synthetic_data.SEASONS = seasons
+    return {name: pd.read_csv(output_dir / name, dtype=str) for name in ('teams.csv', 'games.csv', 'games_details.csv')}
+
+# Source CSVs of the first season only, and the rows of the second one to append to them
+@pytest.fixture
+def dataset_dir(tmp_path, sources):
+    games = sources['games.csv']
+    first_games = games.loc[games['SEASON'] == str(SEASONS[0]), 'GAME_ID']
+    details = sources['games_details.csv']
+    first_details = details['GAME_ID'].isin(first_games)
+    dataset_dir = tmp_path / 'dataset'
+    dataset_dir.mkdir()
+    sources['teams.csv'].to_csv(dataset_dir / 'teams.csv', index=False)
+    games[games['GAME_ID'].isin(first_games)].to_csv(dataset_dir / 'games.csv', index=False)
+    details[first_details].to_csv(dataset_dir / 'games_details.csv', index=False)
+    return dataset_dir
+
+# Import the dashboard module on the given sources, it loads DATA while it is imported
+def load_app_module(dataset_dir, cache_dir):
+    os.environ.update({'NBA_DATASET_DIR': str(dataset_dir), 'NBA_CACHE_DIR': str(cache_dir), 'NBA_FIGURE_CACHE': 'none', 'NBA_MMAP': '1'})
+    spec = importlib.util.spec_from_file_location('nba_scouting_stats', os.path.join(ROOT, 'nba-scouting-stats.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Append rows to a source CSV, without header
+def append_rows(path, rows):
+    with open(path, 'a') as f:
+        rows.to_csv(f, header=False, index=False)
+
+# Second season rows
+def second_season(sources):
+    games = sources['games.csv']
+    games = games[games['SEASON'] == str(SEASONS[1])]
+    details = sources['games_details.csv']
+    return games, details[details['GAME_ID'].isin(games['GAME_ID'])]
+
+# Data of a full reload of the current sources, in a separate cache directory
+def full_reload(module, dataset_dir, cache_dir):
+    stats = module.source_stats(str(dataset_dir))
+    return module.build_dashboard_data(*module.load_dataset(str(dataset_dir), str(cache_dir), rebuild=True, stats=stats), stats,
+                                       module.source_checkpoints(str(dataset_dir), stats))
+
+# Same games, rollups, indexes and leaderboards
+def assert_same_data(data, expected):
+    pd.testing.assert_frame_equal(data['games'], expected['games'], check_dtype=False, check_categorical=False)
+    for level in expected['rollups']:
+        for agg in ('sum', 'count', 'mean'):
+            pd.testing.assert_frame_equal(data['rollups'][level][agg], expected['rollups'][level][agg],
+                                          check_dtype=False, check_categorical=False, check_index_type=False)
+    for agg in ('sum', 'mean'):
+        for season, board in expected['leaderboards'][agg].items():
+            pd.testing.assert_frame_equal(data['leaderboards'][agg][season].reset_index(drop=True), board.reset_index(drop=True),
+                                          check_dtype=False, check_categorical=False)
+    assert data['player_index'] == expected['player_index']
+    assert data['dropdowns'] == expected['dropdowns']
+
+def test_incremental_refresh_matches_full_reload(dataset_dir, sources, tmp_path):
+    module = load_app_module(dataset_dir, tmp_path / 'cache')
+    games, details = second_season(sources)
+    append_rows(dataset_dir / 'games.csv', games)
+    append_rows(dataset_dir / 'games_details.csv', details)
+    assert module.refresh_dataset() == 'incremental'
+    assert module.refresh_dataset() == 'unchanged'
+    expected = full_reload(module, dataset_dir, tmp_path / 'full')
+    assert module.DATA['version'] == expected['version']
+    assert_same_data(module.DATA, expected)
+
+def test_repeated_rows_are_ingested_once(dataset_dir, sources, tmp_path):
+    module = load_app_module(dataset_dir, tmp_path / 'cache')
+    rows = len(module.DATA['games'])
+    append_rows(dataset_dir / 'games_details.csv', sources['games_details.csv'].head(100))
+    assert module.refresh_dataset() == 'unchanged'
+    assert len(module.DATA['games']) == rows
+
+def test_rows_of_a_missing_game_do_not_block_the_refresh(dataset_dir, sources, tmp_path):
+    module = load_app_module(dataset_dir, tmp_path / 'cache')
+    games, details = second_season(sources)
+    orphan = details.head(1).assign(GAME_ID=ORPHAN_GAME_ID)
+    append_rows(dataset_dir / 'games.csv', games)
+    append_rows(dataset_dir / 'games_details.csv', pd.concat([orphan, details]))
+    size = os.path.getsize(dataset_dir / 'games_details.csv')
+    ## The games after the orphan line are ingested at once, the line itself waits for its game
+    assert module.refresh_dataset() == 'incremental'
+    assert module.DATA['sources']['games_details.csv'][0] < size
+    for _ in range(module.PENDING_REFRESHES - 1):
+        assert module.refresh_dataset() == 'unchanged'
+        assert module.DATA['pending'] is not None
+    ## Then it is dropped, like a full reload does
+    assert module.refresh_dataset() == 'unchanged'
+    assert module.DATA['sources']['games_details.csv'][0] == size
+    assert module.DATA['pending'] is None
+    assert module.refresh_dataset() == 'unchanged'
+    assert_same_data(module.DATA, full_reload(module, dataset_dir, tmp_path / 'full'))
+
+def test_orphan_line_is_ingested_when_its_game_arrives(dataset_dir, sources, tmp_path):
+    module = load_app_module(dataset_dir, tmp_path / 'cache')
+    games, details = second_season(sources)
+    first_game = details['GAME_ID'] == games['GAME_ID'].iloc[0]
+    append_rows(dataset_dir / 'games_details.csv', details[first_game])
+    assert module.refresh_dataset() == 'unchanged'
+    append_rows(dataset_dir / 'games.csv', games.head(1))
+    assert module.refresh_dataset() == 'incremental'
+    assert module.DATA['pending'] is None
+    assert np.isin(int(games['GAME_ID'].iloc[0]), module.DATA['games']['GAME_ID'].to_numpy())
+
+def test_invalid_delta_leaves_the_sources_untouched(dataset_dir, sources, tmp_path):
+    module = load_app_module(dataset_dir, tmp_path / 'cache')
+    games, details = second_season(sources)
+    delta_dir = tmp_path / 'delta'
+    delta_dir.mkdir()
+    games.to_csv(delta_dir / 'games.csv', index=False)
+    details.drop(columns='PLAYER_NAME').to_csv(delta_dir / 'games_details.csv', index=False)
+    stats = module.source_stats(str(dataset_dir))
+    assert module.refresh_dataset(delta_dir=str(delta_dir)) == 'failed'
+    assert module.source_stats(str(dataset_dir)) == stats
+    details.to_csv(delta_dir / 'games_details.csv', index=False)
+    assert module.refresh_dataset(delta_dir=str(delta_dir)) == 'incremental'
+
+def test_other_process_maps_the_published_version(dataset_dir, sources, tmp_path):
+    leader = load_app_module(dataset_dir, tmp_path / 'cache')
+    follower = load_app_module(dataset_dir, tmp_path / 'cache')
+    games, details = second_season(sources)
+    append_rows(dataset_dir / 'games.csv', games)
+    append_rows(dataset_dir / 'games_details.csv', details)
+    assert leader.refresh_dataset() == 'incremental'
+    assert follower.refresh_dataset() == 'reloaded'
+    assert follower.DATA['version'] == leader.DATA['version']
+    ## The large indexes are mapped from the cache version, not rebuilt in the follower
+    assert isinstance(follower.DATA['trends']['players']['cumsum'], np.memmap)
+    assert isinstance(follower.DATA['similarity']['matrix'], np.memmap)
+    assert_same_data(follower.DATA, leader.DATA)
@@ -0,0 +1,24 @@
+#### Production entry point
+## Exposes the Flask server of the dashboard for a WSGI server, e.g.: gunicorn -c gunicorn.conf.py wsgi:server
+## With preload_app (see gunicorn.conf.py) the dataset is loaded once in the master process and the forked
+## workers attach to it: the columns of games_full_df are memory-mapped read-only from the dataset cache.
+import os
+import gc
+import importlib.util
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nba-scouting-stats.py')
+
+## Memory-mapped dataset by default, so that every worker shares the same pages
+os.environ.setdefault('NBA_MMAP', '1')
+
+# The dashboard module has a dash in its file name, load it from its path
+spec = importlib.util.spec_from_file_location('nba_scouting_stats', APP_PATH)
+dashboard = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dashboard)
+
+app = dashboard.app
+server = app.server
+
+## Move everything allocated so far out of the garbage collector, otherwise its passes in the workers
+## write to the object headers and copy the shared pages
+gc.freeze()